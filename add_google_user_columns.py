@@ -1,104 +1,57 @@
 """
 Migration script to add Google OAuth user columns to users table
 """
-import os
-from sqlalchemy import create_engine, text
-from dotenv import load_dotenv
-
-load_dotenv()
-
-DATABASE_URL = os.getenv('DATABASE_URL')
-
-if not DATABASE_URL:
-    raise ValueError("DATABASE_URL environment variable not set.")
-
-# Ensure the URL is compatible with psycopg2
-if DATABASE_URL.startswith("postgres://"):
-    DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
-
-engine = create_engine(DATABASE_URL)
-
-def run_migration():
-    print("Connecting to database...")
+import argparse
+import logging
+from sqlalchemy import text
+
+from db import get_engine
+
+log = logging.getLogger('migrate')
+
+# IF NOT EXISTS makes each clause idempotent, so no information_schema
+# pre-check is needed; DROP NOT NULL is a no-op on a nullable column.
+# Everything goes into one ALTER TABLE so the table lock is taken once.
+MIGRATION_STATEMENTS = [
+    """ALTER TABLE users 
+    ADD COLUMN IF NOT EXISTS google_id VARCHAR(255) UNIQUE,
+    ADD COLUMN IF NOT EXISTS full_name VARCHAR(200),
+    ADD COLUMN IF NOT EXISTS profile_picture VARCHAR(500),
+    ALTER COLUMN password_hash DROP NOT NULL""",
+]
+
+def run_migration(dry_run=False):
+    if dry_run:
+        log.info("\n".join(MIGRATION_STATEMENTS))
+        return
+    
+    log.info("Connecting to database...")
+    engine = get_engine()
     try:
-        with engine.connect() as connection:
-            print("Running migration...")
-            
-            # Check if columns already exist
-            result = connection.execute(text("""
-                SELECT column_name 
-                FROM information_schema.columns 
-                WHERE table_name='users' 
-                AND column_name IN ('google_id', 'full_name', 'profile_picture')
-            """))
-            existing_columns = [row[0] for row in result]
-            
-            # Add google_id column if it doesn't exist
-            if 'google_id' not in existing_columns:
-                connection.execute(text("""
-                    ALTER TABLE users 
-                    ADD COLUMN google_id VARCHAR(255) UNIQUE
-                """))
-                print("✅ Successfully added 'google_id' column to users table")
-            else:
-                print("ℹ️  'google_id' column already exists. Skipping.")
-            
-            # Add full_name column if it doesn't exist
-            if 'full_name' not in existing_columns:
-                connection.execute(text("""
-                    ALTER TABLE users 
-                    ADD COLUMN full_name VARCHAR(200)
-                """))
-                print("✅ Successfully added 'full_name' column to users table")
-            else:
-                print("ℹ️  'full_name' column already exists. Skipping.")
-            
-            # Add profile_picture column if it doesn't exist
-            if 'profile_picture' not in existing_columns:
-                connection.execute(text("""
-                    ALTER TABLE users 
-                    ADD COLUMN profile_picture VARCHAR(500)
-                """))
-                print("✅ Successfully added 'profile_picture' column to users table")
-            else:
-                print("ℹ️  'profile_picture' column already exists. Skipping.")
-            
-            # Make password_hash nullable (for Google OAuth users)
-            # Check current nullability
-            result = connection.execute(text("""
-                SELECT is_nullable 
-                FROM information_schema.columns 
-                WHERE table_name='users' 
-                AND column_name='password_hash'
-            """))
-            password_nullable = result.scalar()
+        # begin() commits once on success and rolls back automatically on error
+        with engine.begin() as connection:
+            log.info("Running migration...")
             
-            if password_nullable == 'NO':
-                connection.execute(text("""
-                    ALTER TABLE users 
-                    ALTER COLUMN password_hash DROP NOT NULL
-                """))
-                print("✅ Made 'password_hash' column nullable (for Google OAuth users)")
-            else:
-                print("ℹ️  'password_hash' column is already nullable. Skipping.")
+            for statement in MIGRATION_STATEMENTS:
+                connection.execute(text(statement))
             
-            connection.commit()
-            print("\n✅ Migration successful!")
-            print("   Columns added:")
-            print("   - google_id (VARCHAR(255), UNIQUE)")
-            print("   - full_name (VARCHAR(200))")
-            print("   - profile_picture (VARCHAR(500))")
-            print("   - password_hash (now nullable)")
+            log.info(
+                "\n✅ Migration successful!\n"
+                "   Columns added:\n"
+                "   - google_id (VARCHAR(255), UNIQUE)\n"
+                "   - full_name (VARCHAR(200))\n"
+                "   - profile_picture (VARCHAR(500))\n"
+                "   - password_hash (now nullable)"
+            )
 
     except Exception as e:
-        print(f"❌ An error occurred during migration: {e}")
-        import traceback
-        traceback.print_exc()
-        # Rollback in case of error
-        with engine.connect() as connection:
-            connection.rollback()
+        log.exception(f"❌ An error occurred during migration: {e}")
         raise
 
 if __name__ == "__main__":
-    run_migration()
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--dry-run', action='store_true', help='Print the planned DDL without executing it')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    run_migration(dry_run=args.dry_run)
 
@@ -2,104 +2,70 @@
 Migration script to add 'processed' column to email_classifications table
 Run this on Railway or your production database
 """
-import os
-from sqlalchemy import create_engine, text
+import argparse
+import logging
+import sys
+from sqlalchemy import text
 
-# Get database URL from environment
-DATABASE_URL = os.getenv('DATABASE_URL')
+from db import get_engine
+from schema_cache import invalidate
 
-if not DATABASE_URL:
-    print("❌ DATABASE_URL environment variable not set")
-    exit(1)
+log = logging.getLogger('migrate')
 
-# Fix postgres:// to postgresql:// for SQLAlchemy compatibility
-if DATABASE_URL.startswith('postgres://'):
-    DATABASE_URL = DATABASE_URL.replace('postgres://', 'postgresql://', 1)
+MIGRATION_STATEMENTS = [
+    # Existing rows are already classified, so add the column with
+    # DEFAULT TRUE: on Postgres 11+ the default is stored in the catalog
+    # and existing rows pick it up without a table rewrite or UPDATE pass.
+    # IF NOT EXISTS makes this a no-op on re-runs.
+    """ALTER TABLE email_classifications 
+    ADD COLUMN IF NOT EXISTS processed BOOLEAN NOT NULL DEFAULT TRUE""",
+    # New rows default to unprocessed
+    """ALTER TABLE email_classifications 
+    ALTER COLUMN processed SET DEFAULT FALSE""",
+]
 
-print(f"Connecting to database...")
-engine = create_engine(DATABASE_URL)
 
-# Migration SQL
-migration_sql = """
--- Add processed column to email_classifications table if it doesn't exist
-DO $$
-BEGIN
-    IF NOT EXISTS (
-        SELECT 1 FROM information_schema.columns 
-        WHERE table_name = 'email_classifications' 
-        AND column_name = 'processed'
-    ) THEN
-        ALTER TABLE email_classifications 
-        ADD COLUMN processed BOOLEAN DEFAULT FALSE;
-        
-        PRINT '✅ Successfully added processed column to email_classifications table';
-    ELSE
-        PRINT 'ℹ️  Column processed already exists in email_classifications table';
-    END IF;
-END $$;
-
--- Set existing rows to processed=true (they're already classified)
-UPDATE email_classifications 
-SET processed = TRUE 
-WHERE processed IS NULL;
-"""
-
-try:
-    with engine.connect() as conn:
-        # Execute migration
-        print("Running migration...")
-        
-        # Check if column exists first
-        result = conn.execute(text("""
-            SELECT column_name 
-            FROM information_schema.columns 
-            WHERE table_name = 'email_classifications' 
-            AND column_name = 'processed'
-        """))
-        
-        if result.fetchone():
-            print("ℹ️  Column 'processed' already exists in email_classifications table")
-        else:
-            # Add the column
-            conn.execute(text("""
-                ALTER TABLE email_classifications 
-                ADD COLUMN processed BOOLEAN DEFAULT FALSE
-            """))
-            conn.commit()
-            print("✅ Successfully added 'processed' column to email_classifications table")
+def run_migration(dry_run=False):
+    if dry_run:
+        log.info("\n".join(MIGRATION_STATEMENTS))
+        return
+    
+    log.info("Connecting to database...")
+    engine = get_engine()
+    try:
+        # begin() commits once on success and rolls back automatically on error
+        with engine.begin() as conn:
+            # Execute migration
+            log.info("Running migration...")
             
-            # Set existing rows to processed=true
-            conn.execute(text("""
-                UPDATE email_classifications 
-                SET processed = TRUE 
-                WHERE processed IS NULL OR processed = FALSE
-            """))
-            conn.commit()
-            print("✅ Set all existing email classifications to processed=true")
-        
-        # Verify the column exists
-        result = conn.execute(text("""
-            SELECT column_name, data_type, column_default
-            FROM information_schema.columns 
-            WHERE table_name = 'email_classifications' 
-            AND column_name = 'processed'
-        """))
-        
-        row = result.fetchone()
-        if row:
-            print(f"\n✅ Migration successful!")
-            print(f"   Column: {row[0]}")
-            print(f"   Type: {row[1]}")
-            print(f"   Default: {row[2]}")
-        else:
-            print("\n❌ Migration may have failed - column not found after migration")
+            for statement in MIGRATION_STATEMENTS:
+                conn.execute(text(statement))
+            log.info("✅ Ensured 'processed' column exists (existing rows marked processed=true)")
+            invalidate('email_classifications')
             
-except Exception as e:
-    print(f"\n❌ Migration failed: {str(e)}")
-    import traceback
-    traceback.print_exc()
-finally:
-    engine.dispose()
+            # The DDL above fully determines the column, so report it directly
+            # rather than re-reading information_schema
+            log.info(
+                "\n✅ Migration successful!\n"
+                "   Column: processed\n"
+                "   Type: boolean\n"
+                "   Default: false"
+            )
+    
+    except Exception as e:
+        log.exception(f"\n❌ Migration failed: {str(e)}")
+        raise
+    
+    log.info("\n✅ Migration complete!")
 
-print("\n✅ Migration complete!")
 
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--dry-run', action='store_true', help='Print the planned DDL without executing it')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    try:
+        run_migration(dry_run=args.dry_run)
+    except ValueError:
+        log.error("❌ DATABASE_URL environment variable not set")
+        sys.exit(1)
@@ -4,20 +4,39 @@ Multi-User Gmail Auto-Reply Web Application
 Each user manages their own Gmail account with complete privacy
 """
 import os
+import re
 import json
+import base64
+import hashlib
+import html
+import io
 import requests
 import time
-from threading import Semaphore
-from flask import Flask, render_template, jsonify, request, redirect, url_for, session, send_file, Response, stream_with_context
+import tempfile
+import traceback
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from email.utils import parseaddr
+from functools import lru_cache
+from threading import Lock, Semaphore, get_ident
+from urllib.parse import urlparse, urlunparse, parse_qs, quote, unquote
+from flask import Flask, render_template, jsonify, request, redirect, url_for, session, send_file, Response, make_response, stream_with_context, g
+from flask.sessions import SecureCookieSessionInterface
+from jinja2 import FileSystemBytecodeCache
 from werkzeug.utils import secure_filename
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from dotenv import load_dotenv
 from sqlalchemy import text
-from models import db, User, GmailToken, EmailClassification, Deal
+from models import db, User, GmailToken, EmailClassification, ClassificationCache, Deal
 from auth import encrypt_token, decrypt_token
-from gmail_client import GmailClient, SCOPES
+from gmail_client import GmailClient, SCOPES, urlsafe_b64decode
+from google_auth_oauthlib.flow import InstalledAppFlow
+from google.oauth2.credentials import Credentials
+from googleapiclient.discovery import build
 from openai_client import OpenAIClient
-from email_classifier import EmailClassifier, CATEGORY_DEAL_FLOW, CATEGORY_NETWORKING, CATEGORY_HIRING, CATEGORY_SPAM, CATEGORY_GENERAL, TAG_DEAL, TAG_GENERAL
+from email_classifier import EmailClassifier, CATEGORY_DEAL_FLOW, CATEGORY_NETWORKING, CATEGORY_HIRING, CATEGORY_SPAM, CATEGORY_GENERAL, CATEGORY_TAGS, DECK_LINK_RE, TAG_DEAL, TAG_GENERAL
 # from tracxn_scorer import TracxnScorer  # Removed - scoring system disabled
 
 # Import background tasks (only if Celery is available)
@@ -28,13 +47,62 @@ except ImportError:
     CELERY_AVAILABLE = False
     print("⚠️  Celery not available - background tasks disabled")
 
+# orjson serializes large payloads (the deals list) several times faster than the json module
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# A successful worker check is trusted for this long, so starting a sync does not
+# wait out a broadcast inspect every time
+WORKER_CHECK_TTL = 30  # seconds
+_workers_seen_at = None  # time.monotonic() of the last check that found active workers
+
 # Rate limiting: Max concurrent OpenAI API calls to prevent 429 errors
 # Increased to 20 for faster processing (Lambda can handle more concurrent requests)
 CLASSIFICATION_SEMAPHORE = Semaphore(20)  # Max 20 concurrent classifications
 
+# Pulls the retry time out of Gmail rate-limit error messages
+RETRY_AFTER_RE = re.compile(r'Retry after ([^\n]+)')
+
+# Emails classified per model call during sync (keeps the prompt and response small)
+CLASSIFY_BATCH_SIZE = 10
+# Classification batches in flight at once per sync (each holds a CLASSIFICATION_SEMAPHORE slot)
+CLASSIFY_WORKERS = 4
+# Tags for deterministic-only classifications; unlike model results, GENERAL gets a tag here
+DETERMINISTIC_TAGS = {**CATEGORY_TAGS, CATEGORY_GENERAL: (TAG_GENERAL,)}
+# Threads per /api/reclassify-bulk request: each one is a model call made in series inside the request
+RECLASSIFY_BULK_MAX_THREADS = 25
+# Upper bound on combined attachment text carried with an email (each attachment is already cut to a short head)
+MAX_ATTACHMENT_TEXT_CHARS = 50_000
+
 # Load environment variables
 load_dotenv()
 
+
+def load_google_credentials():
+    """Load Google OAuth client config from GOOGLE_CREDENTIALS_JSON (raw or base64) or credentials.json"""
+    # Try to get credentials from environment variable first (for Railway)
+    credentials_json = os.getenv('GOOGLE_CREDENTIALS_JSON')
+    try:
+        if credentials_json:
+            try:
+                return json.loads(credentials_json)
+            except json.JSONDecodeError:
+                # Try base64 decode if JSON parsing fails
+                return json.loads(base64.b64decode(credentials_json).decode('utf-8'))
+        if os.path.exists('credentials.json'):
+            # Fall back to file (for local development)
+            with open('credentials.json', 'r') as f:
+                return json.load(f)
+    except Exception as e:
+        print(f"⚠️  Could not parse Google OAuth credentials: {e}")
+    return None
+
+
+# Parsed once; None means Google sign-in / Gmail connect is unavailable
+GOOGLE_CREDENTIALS = load_google_credentials()
+
 # Debug: Print SEND_EMAILS value on startup
 send_emails_debug = os.getenv('SEND_EMAILS', 'false')
 print(f"📧 Email sending: {'ENABLED' if send_emails_debug.lower() == 'true' else 'DISABLED'} (SEND_EMAILS={send_emails_debug})")
@@ -57,6 +125,26 @@ app.config['PERMANENT_SESSION_LIFETIME'] = 1800  # 30 minutes
 app.config['SESSION_COOKIE_DOMAIN'] = None  # Restrict to current domain only
 app.config['SESSION_COOKIE_PATH'] = '/'
 
+# Cache compiled templates on disk so restarted workers skip Jinja compilation
+# (auto_reload already follows app.debug, so production skips template mtime checks)
+jinja_cache_dir = os.getenv('JINJA_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'jinja_cache'))
+os.makedirs(jinja_cache_dir, exist_ok=True)
+app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory=jinja_cache_dir)
+
+# Compress JSON responses (thread bodies, deal lists) for clients that accept it.
+# Streamed responses (the SSE email stream, attachment downloads) are left alone.
+try:
+    from flask_compress import Compress
+    app.config['COMPRESS_MIMETYPES'] = ['application/json']
+    app.config['COMPRESS_ALGORITHM'] = ['br', 'gzip']
+    app.config['COMPRESS_LEVEL'] = 6  # gzip
+    app.config['COMPRESS_BR_LEVEL'] = 4
+    app.config['COMPRESS_MIN_SIZE'] = 1024
+    app.config['COMPRESS_STREAMS'] = False
+    Compress(app)
+except ImportError:
+    print("⚠️  flask-compress not installed - responses are sent uncompressed")
+
 # Trust proxy headers for HTTPS detection (required for Railway)
 # This allows Flask to detect HTTPS when behind a reverse proxy
 from werkzeug.middleware.proxy_fix import ProxyFix
@@ -96,10 +184,47 @@ login_manager.login_view = 'login'
 login_manager.login_message = 'Please log in to access this page.'
 
 
-# Error handler to catch session serialization errors and clear problematic session data
+# Session values that are not JSON serializable (e.g. OAuth flow objects) must be
+# stored under this prefix so they can be dropped without probing every value
+TRANSIENT_SESSION_PREFIX = '_nontx_'
+
+
+def drop_transient_session_keys():
+    """Remove transient values and OAuth flow objects from the session"""
+    for key in list(session.keys()):
+        lowered = key.lower()
+        if key.startswith(TRANSIENT_SESSION_PREFIX) or ('oauth' in lowered and 'flow' in lowered):
+            session.pop(key, None)
+
+
+# Types the signed-cookie serializer can store
+SESSION_SAFE_TYPES = (str, int, float, bool, type(None), list, dict, tuple, bytes, datetime)
+
+
+class SafeSessionInterface(SecureCookieSessionInterface):
+    """Cookie sessions that drop transient and non-serializable values when the cookie is written"""
+    
+    def save_session(self, app, session, response):
+        # Unmodified sessions only hold values that already passed this check when written
+        if not session.modified:
+            return super().save_session(app, session, response)
+        
+        for key in list(session.keys()):
+            value = session[key]
+            if key.startswith(TRANSIENT_SESSION_PREFIX) or not isinstance(value, SESSION_SAFE_TYPES):
+                if not MINIMAL_LOGGING:
+                    print(f"🧹 Dropping session key '{key}' ({type(value).__name__}) before saving")
+                session.pop(key, None)
+        super().save_session(app, session, response)
+
+
+app.session_interface = SafeSessionInterface()
+
+
+# Session security checks before each request
 @app.before_request
 def clear_problematic_session_data():
-    """Clear any non-serializable objects from session before each request"""
+    """Log out stale or mismatched sessions before each request"""
     try:
         # SECURITY: On login page, force clear any stale authentication
         # This prevents auto-login from stale session cookies
@@ -119,29 +244,8 @@ def clear_problematic_session_data():
                     session.clear()
                     session.modified = True
                     # Don't redirect here - let the route handle it (some routes don't require auth)
-        
-        # Check if session has any problematic keys
-        keys_to_remove = []
-        for key in list(session.keys()):
-            # Check if value is not JSON serializable by trying to serialize it
-            try:
-                import json
-                json.dumps(session[key])
-            except (TypeError, ValueError):
-                # This value is not serializable, mark for removal
-                keys_to_remove.append(key)
-            # Also proactively remove OAuth flow objects
-            if 'oauth' in key.lower() or 'flow' in key.lower():
-                if key not in keys_to_remove:
-                    keys_to_remove.append(key)
-        
-        # Remove problematic keys
-        for key in keys_to_remove:
-            try:
-                session.pop(key, None)
-            except:
-                pass
-    except:
+        # Non-serializable values are dropped by SafeSessionInterface when the cookie is saved
+    except Exception:
         # If anything goes wrong, just continue
         pass
 
@@ -208,6 +312,18 @@ def run_lazy_migrations():
             is_postgres = False
         
         if not is_postgres:
+            # Tags moved from comma-separated text to a JSON list
+            try:
+                db.session.execute(text("""
+                    UPDATE email_classifications
+                    SET tags = CASE WHEN tags = '' THEN NULL
+                                    ELSE '["' || replace(tags, ',', '","') || '"]' END
+                    WHERE tags IS NOT NULL AND tags NOT LIKE '[%'
+                """))
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                print(f"⚠️  Tags migration error: {e}")
             _migrations_run = True
             return
         
@@ -376,6 +492,84 @@ def run_lazy_migrations():
         except Exception:
             db.session.rollback()
         
+        # Tags array migration (comma-separated VARCHAR -> text array)
+        try:
+            result = db.session.execute(text("""
+                SELECT data_type 
+                FROM information_schema.columns 
+                WHERE table_name = 'email_classifications' 
+                AND column_name = 'tags'
+            """))
+            row = result.fetchone()
+            if row and row[0] != 'ARRAY':
+                print("🔄 Running lazy migration: Converting tags to an array column...")
+                db.session.execute(text("""
+                    ALTER TABLE email_classifications 
+                    ALTER COLUMN tags TYPE VARCHAR(64)[] 
+                    USING string_to_array(NULLIF(tags, ''), ',');
+                """))
+                db.session.commit()
+                print("✅ Tags array migration completed")
+        except Exception as e:
+            db.session.rollback()
+            print(f"⚠️  Tags migration error: {e}")
+        
+        # Extracted links migration (JSON text -> jsonb)
+        try:
+            result = db.session.execute(text("""
+                SELECT data_type 
+                FROM information_schema.columns 
+                WHERE table_name = 'email_classifications' 
+                AND column_name = 'extracted_links'
+            """))
+            row = result.fetchone()
+            if row and row[0] != 'jsonb':
+                print("🔄 Running lazy migration: Converting extracted_links to jsonb...")
+                db.session.execute(text("""
+                    ALTER TABLE email_classifications 
+                    ALTER COLUMN extracted_links TYPE JSONB 
+                    USING NULLIF(extracted_links, '')::jsonb;
+                """))
+                db.session.commit()
+                print("✅ Extracted links migration completed")
+        except Exception as e:
+            db.session.rollback()
+            print(f"⚠️  Extracted links migration error: {e}")
+        
+        # Deal JSON columns migration (JSON text -> jsonb)
+        try:
+            result = db.session.execute(text("""
+                SELECT column_name 
+                FROM information_schema.columns 
+                WHERE table_name = 'deals' 
+                AND column_name IN ('founder_previous_companies', 'portfolio_overlaps', 'white_space_analysis')
+                AND data_type != 'jsonb'
+            """))
+            text_json_columns = [row[0] for row in result]
+            if text_json_columns:
+                print(f"🔄 Running lazy migration: Converting {', '.join(text_json_columns)} to jsonb...")
+                for column in text_json_columns:
+                    db.session.execute(text(f"""
+                        ALTER TABLE deals 
+                        ALTER COLUMN {column} TYPE JSONB 
+                        USING NULLIF({column}, '')::jsonb;
+                    """))
+                db.session.commit()
+                print("✅ Deal JSON columns migration completed")
+        except Exception as e:
+            db.session.rollback()
+            print(f"⚠️  Deal JSON columns migration error: {e}")
+        
+        # Cached Gmail address migration
+        try:
+            db.session.execute(text("""
+                ALTER TABLE gmail_tokens 
+                ADD COLUMN IF NOT EXISTS email_address VARCHAR(255);
+            """))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+        
         # Unique constraint migration (prevents duplicate emails)
         try:
             # Check if unique constraint already exists
@@ -431,6 +625,31 @@ def run_lazy_migrations():
             db.session.rollback()
             print(f"⚠️  Unique constraint migration check error: {e}")
         
+        # Listing and thread lookup index migration (create_all only builds indexes for new tables)
+        # migrations/add_listing_indexes.py builds these without blocking writes
+        try:
+            db.session.execute(text("""
+                CREATE INDEX IF NOT EXISTS idx_user_classified
+                ON email_classifications (user_id, classified_at DESC);
+            """))
+            db.session.execute(text("""
+                CREATE INDEX IF NOT EXISTS idx_user_category_classified
+                ON email_classifications (user_id, category, classified_at DESC);
+            """))
+            # Per-thread lookups on both tables
+            db.session.execute(text("""
+                CREATE INDEX IF NOT EXISTS idx_user_thread
+                ON email_classifications (user_id, thread_id);
+            """))
+            db.session.execute(text("""
+                CREATE INDEX IF NOT EXISTS idx_user_thread_deal
+                ON deals (user_id, thread_id);
+            """))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"⚠️  Listing index migration error: {e}")
+        
         _migrations_run = True
         print("✅ Lazy migrations completed")
     except Exception as e:
@@ -466,6 +685,13 @@ def set_user_context_for_rls():
 print("✅ App initialized (database connection and migrations will happen on first request)")
 
 
+def json_response(payload, status=200):
+    """jsonify() for large payloads (deals, thread bodies): serialized with orjson when it is installed"""
+    if orjson is None:
+        return jsonify(payload), status
+    return app.response_class(orjson.dumps(payload), status=status, mimetype='application/json')
+
+
 # Global OpenAI client (shared API key from .env)
 openai_client = None
 
@@ -478,12 +704,44 @@ def get_openai_client():
     return openai_client
 
 
+class _GmailAuthFailed(Exception):
+    """Carries a Gmail client whose authentication failed out of _build_gmail_client, so lru_cache keeps nothing"""
+    def __init__(self, gmail_client):
+        super().__init__('Gmail authentication failed')
+        self.gmail_client = gmail_client
+
+
+@lru_cache(maxsize=512)
+def _build_gmail_client(user_id, token_fingerprint, encrypted_token, thread_id):
+    """Decrypt a stored token and build its Gmail client (memoized per user + token + thread)"""
+    token_json = decrypt_token(encrypted_token)
+    
+    # Create Gmail client with user's token
+    gmail_client = GmailClient(token_json=token_json)
+    if not gmail_client.service:
+        # Token refresh can fail transiently (network, 5xx); the stored token must be tried again next time
+        raise _GmailAuthFailed(gmail_client)
+    print(f"✅ Successfully created Gmail client for user {user_id}")
+    return gmail_client
+
+
+def forget_gmail_clients():
+    """Drop cached Gmail clients after a user's stored token changes"""
+    _build_gmail_client.cache_clear()
+    g.pop('gmail_client', None)
+
+
 def get_user_gmail_client(user):
     """Get Gmail client for current user"""
     if not user:
         print(f"❌ No user provided to get_user_gmail_client")
         return None
     
+    # Reuse the client already built for this user during the current request
+    cached = g.get('gmail_client')
+    if cached and cached[0] == user.id:
+        return cached[1]
+    
     if not user.gmail_token:
         print(f"❌ User {user.id} has no gmail_token. Please reconnect Gmail.")
         return None
@@ -495,11 +753,16 @@ def get_user_gmail_client(user):
             print(f"❌ User {user.id} has empty encrypted_token")
             return None
             
-        token_json = decrypt_token(encrypted_token)
-        
-        # Create Gmail client with user's token
-        gmail_client = GmailClient(token_json=token_json)
-        print(f"✅ Successfully created Gmail client for user {user.id}")
+        # Reuse the client built for this exact token; a new token gets a new fingerprint.
+        # Clients are per thread: gunicorn serves requests from a thread pool and the
+        # httplib2 transport underneath the Gmail service is not thread-safe.
+        token_fingerprint = hashlib.blake2b(encrypted_token.encode(), digest_size=16).hexdigest()
+        try:
+            gmail_client = _build_gmail_client(user.id, token_fingerprint, encrypted_token, get_ident())
+        except _GmailAuthFailed as e:
+            # Not memoized anywhere: the next call builds the client again
+            return e.gmail_client
+        g.gmail_client = (user.id, gmail_client)
         return gmail_client
     except Exception as e:
         print(f"❌ Error getting Gmail client for user {user.id}: {str(e)}")
@@ -508,6 +771,248 @@ def get_user_gmail_client(user):
         return None
 
 
+# Signature placeholders the model sometimes leaves at the end of generated replies
+SIGNATURE_PLACEHOLDER_RE = re.compile(r'\[Your (?:Name|Position|Firm|Contact Information)\]')
+
+
+def join_attachment_texts(attachments):
+    """Join the extracted texts of an email's attachments (None if none has text)"""
+    attachment_text = '\n\n'.join(att['text'] for att in attachments if att.get('text'))
+    return attachment_text[:MAX_ATTACHMENT_TEXT_CHARS] or None
+
+
+def strip_signature_placeholders(reply_text):
+    """Cut a generated reply at the first signature placeholder, if any"""
+    match = SIGNATURE_PLACEHOLDER_RE.search(reply_text)
+    if match:
+        # Remove the placeholder and everything after it
+        return reply_text[:match.start()].strip()
+    return reply_text
+
+
+# HTML-to-text conversion for signature previews
+# One scan over the tags: <br> becomes a newline, </p> a paragraph break, every other tag is dropped
+HTML_TAG_RE = re.compile(r'(?P<br><br\s*/?>)|(?P<paragraph_close></p>)|<[^>]+>', re.IGNORECASE)
+EXTRA_NEWLINES_RE = re.compile(r'\n{3,}')
+
+
+def _html_tag_replacement(match):
+    if match.group('br'):
+        return '\n'
+    if match.group('paragraph_close'):
+        return '\n\n'
+    return ''
+
+
+def signature_preview_text(signature_html):
+    """Render an HTML Gmail signature as plain text for previews"""
+    text = HTML_TAG_RE.sub(_html_tag_replacement, signature_html)
+    # Decode HTML entities in one pass (&nbsp; stays a plain space)
+    text = html.unescape(text).replace('\xa0', ' ')
+    # Clean up multiple newlines and whitespace
+    return EXTRA_NEWLINES_RE.sub('\n\n', text).strip()
+
+
+# Collapses whitespace so re-wrapped or re-indented copies of an email hash the same
+WHITESPACE_RE = re.compile(r'\s+')
+
+
+def normalize_for_hash(value):
+    """Lower-case and collapse whitespace so trivially different copies share a cache entry"""
+    return WHITESPACE_RE.sub(' ', value or '').strip().lower()
+
+
+def classification_content_hash(subject, sender, body, has_pdf_attachment, headers):
+    """Hash the inputs that determine a classification, for ClassificationCache lookups"""
+    # The rules also read a few headers (spam score, mailing-list markers)
+    spam_score, is_mailing_list = EmailClassifier.deterministic_header_key(headers or {})
+    content = '\x00'.join([
+        normalize_for_hash(subject), normalize_for_hash(sender), normalize_for_hash(body),
+        '1' if has_pdf_attachment else '0',
+        str(spam_score), '1' if is_mailing_list else '0'
+    ])
+    return hashlib.sha256(content.encode('utf-8', errors='replace')).hexdigest()
+
+
+def classify_email_cached(classifier, subject, body, headers, sender, links, thread_id=None,
+                          user_id=None, has_pdf_attachment=False, refresh=False, commit=True):
+    """
+    classifier.classify_email backed by ClassificationCache: identical content reuses the stored
+    result instead of a model call. refresh=True always asks the model and overwrites the entry.
+    Only results the model actually labeled are cached.
+    commit=False writes the cache row in a savepoint and leaves the commit to the caller.
+    """
+    content_hash = classification_content_hash(subject, sender, body, has_pdf_attachment, headers)
+    if not refresh:
+        cached = ClassificationCache.query.get(content_hash)
+        if cached:
+            return {
+                'category': cached.category,
+                'confidence': cached.confidence,
+                'tags': list(cached.tags or []),
+                'links': links
+            }
+    
+    # Rate limit concurrent classifications to prevent 429 errors
+    with CLASSIFICATION_SEMAPHORE:
+        classification_result = classifier.classify_email(
+            subject=subject,
+            body=body,
+            headers=headers,
+            sender=sender,
+            links=links,
+            has_pdf_attachment=has_pdf_attachment,
+            thread_id=thread_id,
+            user_id=user_id
+        )
+    
+    # A rule-based fallback (Lambda timeout/outage) is not a model answer; caching it would
+    # keep every identical email from ever reaching the model
+    if not classification_result.get('model_labeled'):
+        return classification_result
+    
+    if not commit:
+        # Savepoint: a concurrent insert of the same hash only undoes the cache row
+        try:
+            with db.session.begin_nested():
+                db.session.merge(ClassificationCache(
+                    content_hash=content_hash,
+                    category=classification_result['category'],
+                    tags=list(classification_result['tags']),
+                    confidence=classification_result['confidence']
+                ))
+        except Exception as e:
+            print(f"⚠️  Could not save classification cache: {str(e)}")
+        return classification_result
+    
+    # Commit the cache row on its own, so a concurrent insert of the same hash
+    # cannot roll back the caller's writes
+    try:
+        db.session.merge(ClassificationCache(
+            content_hash=content_hash,
+            category=classification_result['category'],
+            tags=list(classification_result['tags']),
+            confidence=classification_result['confidence']
+        ))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"⚠️  Could not save classification cache: {str(e)}")
+    return classification_result
+
+
+# Gmail rejects batch requests with more than 100 calls
+GMAIL_BATCH_LIMIT = 100
+
+# Decoded bytes per chunk when streaming an attachment download
+ATTACHMENT_CHUNK_SIZE = int(os.getenv('ATTACHMENT_CHUNK_SIZE', 64 * 1024))
+# Attachments up to this decoded size are sent whole (with Range support); larger ones are streamed
+ATTACHMENT_STREAM_MIN_SIZE = int(os.getenv('ATTACHMENT_STREAM_MIN_SIZE', 10 * 1024 * 1024))
+
+# Partial response for locating attachments: part names, types and attachment IDs (four MIME
+# levels deep), without the base64 body data of inline text/HTML parts
+ATTACHMENT_PART_FIELDS = 'filename,mimeType,body/attachmentId'
+ATTACHMENT_LOOKUP_FIELDS = 'payload({0},parts({0},parts({0},parts({0},parts({0})))))'.format(ATTACHMENT_PART_FIELDS)
+
+# Attachment downloads per Gmail batch call in /api/attachments (keeps per-account concurrency low)
+ATTACHMENT_BATCH_SIZE = 5
+
+# Part trees of recently opened messages, keyed by (user_id, message_id): reloading a
+# preview or opening a sibling attachment skips the messages.get lookup
+ATTACHMENT_PARTS_TTL = 300  # seconds
+ATTACHMENT_PARTS_CACHE_SIZE = 2048
+_attachment_parts_cache = OrderedDict()  # key -> (time.monotonic() fetched, payload, complete)
+_attachment_parts_lock = Lock()
+
+
+def get_attachment_parts(gmail, user_id, message_id, complete=False):
+    """
+    A message's MIME part tree (names, types, attachment IDs), cached for ATTACHMENT_PARTS_TTL seconds.
+    The default lookup stops four levels deep; complete=True fetches the whole tree without the
+    fields mask, for attachments nested deeper (forwards of forwards).
+    """
+    key = (user_id, message_id)
+    with _attachment_parts_lock:
+        cached = _attachment_parts_cache.get(key)
+        if cached and time.monotonic() - cached[0] < ATTACHMENT_PARTS_TTL and (cached[2] or not complete):
+            _attachment_parts_cache.move_to_end(key)
+            return cached[1]
+    
+    if complete:
+        message = gmail.service.users().messages().get(userId='me', id=message_id, format='full').execute()
+    else:
+        message = gmail.service.users().messages().get(
+            userId='me',
+            id=message_id,
+            format='full',
+            fields=ATTACHMENT_LOOKUP_FIELDS
+        ).execute()
+    payload = message.get('payload', {})
+    if complete:
+        # Keep the cached tree as small as the masked one: drop the body data of inline parts
+        stack = [payload]
+        while stack:
+            part = stack.pop()
+            part.get('body', {}).pop('data', None)
+            stack.extend(part.get('parts', []))
+    
+    with _attachment_parts_lock:
+        _attachment_parts_cache[key] = (time.monotonic(), payload, complete)
+        _attachment_parts_cache.move_to_end(key)
+        if len(_attachment_parts_cache) > ATTACHMENT_PARTS_CACHE_SIZE:
+            _attachment_parts_cache.popitem(last=False)
+    return payload
+
+
+def named_attachment_parts(payload):
+    """Parts of a MIME tree that carry a filename, in document order"""
+    named = []
+    stack = [payload]
+    while stack:
+        part = stack.pop()
+        if part.get('filename'):
+            named.append(part)
+        # Reversed, so sibling parts are visited in document order
+        stack.extend(reversed(part.get('parts', [])))
+    return named
+
+
+def forget_attachment_parts(user_id, message_id):
+    """Drop a cached part tree (message deleted, or its attachment IDs no longer valid)"""
+    with _attachment_parts_lock:
+        _attachment_parts_cache.pop((user_id, message_id), None)
+
+
+def batch_fetch_label_ids(gmail, message_ids):
+    """Fetch star/read status for messages via Gmail batch requests (100 per HTTP call)"""
+    results = {}
+    if not message_ids:
+        return results
+
+    def label_callback(request_id, response, exception):
+        if exception or not response:
+            return
+        label_ids = response.get('labelIds', [])
+        results[request_id] = {
+            'is_starred': 'STARRED' in label_ids,
+            'label_ids': label_ids if isinstance(label_ids, list) else []
+        }
+
+    for chunk_start in range(0, len(message_ids), GMAIL_BATCH_LIMIT):
+        batch = gmail.service.new_batch_http_request(callback=label_callback)
+        for msg_id in message_ids[chunk_start:chunk_start + GMAIL_BATCH_LIMIT]:
+            # Only labelIds are needed - keep the per-message payload minimal
+            batch.add(gmail.service.users().messages().get(
+                userId='me',
+                id=msg_id,
+                format='metadata',
+                fields='labelIds'
+            ), request_id=msg_id)
+        batch.execute()
+
+    return results
+
+
 # ==================== AUTHENTICATION ROUTES ====================
 
 @app.route('/')
@@ -558,7 +1063,6 @@ def login():
         session.modified = True
         
         # Clear session cookie
-        from flask import make_response
         response = make_response(render_template('login.html'))
         
         # Delete session cookie with all configurations
@@ -642,7 +1146,6 @@ def login():
                     next_url = request.args.get('next') or request.form.get('next')
                     if next_url:
                         # Validate next_url to prevent open redirects
-                        from urllib.parse import urlparse
                         parsed = urlparse(next_url)
                         if parsed.netloc == '' or parsed.netloc == request.host:
                             return redirect(next_url)
@@ -654,7 +1157,6 @@ def login():
                         # Redirect to connect_gmail with error message
                         error_param = f'?error={oauth_error}'
                         if oauth_error_message:
-                            from urllib.parse import quote
                             error_param += f'&message={quote(oauth_error_message)}'
                         return redirect(url_for('connect_gmail') + error_param)
                     
@@ -687,7 +1189,6 @@ def login():
     elif error:
         # Decode URL-encoded message
         if message:
-            from urllib.parse import unquote
             message = unquote(message)
         display_error = message or 'An error occurred. Please try again.'
     
@@ -698,21 +1199,9 @@ def login():
 def signup_google():
     """Initiate Google OAuth signup flow"""
     try:
-        from google_auth_oauthlib.flow import InstalledAppFlow
-        import json
-        
         # Get credentials
-        credentials_json = os.getenv('GOOGLE_CREDENTIALS_JSON')
-        if credentials_json:
-            try:
-                credentials_data = json.loads(credentials_json)
-            except json.JSONDecodeError:
-                import base64
-                credentials_data = json.loads(base64.b64decode(credentials_json).decode('utf-8'))
-        elif os.path.exists('credentials.json'):
-            with open('credentials.json', 'r') as f:
-                credentials_data = json.load(f)
-        else:
+        credentials_data = GOOGLE_CREDENTIALS
+        if not credentials_data:
             return jsonify({'error': 'Google OAuth credentials not found'}), 500
         
         # Create flow with userinfo scopes
@@ -827,7 +1316,6 @@ def logout():
     session.modified = True
     
     # Create response BEFORE any redirect to ensure we can set cookies
-    from flask import make_response
     response = make_response(redirect(url_for('index')))
     
     # CRITICAL: Delete session cookie with ALL possible configurations
@@ -890,16 +1378,21 @@ def dashboard():
     has_gmail = current_user.gmail_token is not None
     gmail_email = None
     
-    # Get Gmail email if connected
+    # Get Gmail email if connected (looked up once per token, then read from the database)
     if has_gmail:
-        try:
-            gmail = get_user_gmail_client(current_user)
-            if gmail:
-                profile = gmail.get_profile()
-                if profile:
-                    gmail_email = profile.get('emailAddress')
-        except Exception as e:
-            print(f"Error getting Gmail email: {str(e)}")
+        gmail_email = current_user.gmail_token.email_address
+        if not gmail_email:
+            try:
+                gmail = get_user_gmail_client(current_user)
+                if gmail:
+                    profile = gmail.get_profile()
+                    if profile:
+                        gmail_email = profile.get('emailAddress')
+                        current_user.gmail_token.email_address = gmail_email
+                        db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                print(f"Error getting Gmail email: {str(e)}")
     
     # Check if setup is needed (first-time user with Gmail connected but setup not completed)
     needs_setup = has_gmail and not current_user.setup_completed
@@ -921,47 +1414,11 @@ def connect_gmail():
         session['from_signup'] = True
     
     try:
-        # Aggressively clear any OAuth-related session data (flow objects are not JSON serializable)
-        # This prevents errors from stale session data
-        keys_to_remove = []
-        for key in list(session.keys()):
-            # Check if value is not JSON serializable
-            try:
-                import json
-                json.dumps(session[key])
-            except (TypeError, ValueError):
-                # This value is not serializable, mark for removal
-                keys_to_remove.append(key)
-            # Also remove any OAuth-related keys
-            if 'oauth' in key.lower() or 'flow' in key.lower():
-                if key not in keys_to_remove:
-                    keys_to_remove.append(key)
-        
-        # Remove problematic keys
-        for key in keys_to_remove:
-            try:
-                session.pop(key, None)
-            except:
-                pass
-        
-        from google_auth_oauthlib.flow import InstalledAppFlow
-        import json
+        # Clear any OAuth flow objects left in the session (they are not JSON serializable)
+        drop_transient_session_keys()
         
-        # Try to get credentials from environment variable first (for Railway)
-        credentials_json = os.getenv('GOOGLE_CREDENTIALS_JSON')
-        if credentials_json:
-            # Decode from environment variable
-            try:
-                credentials_data = json.loads(credentials_json)
-            except json.JSONDecodeError:
-                # Try base64 decode if JSON parsing fails
-                import base64
-                credentials_data = json.loads(base64.b64decode(credentials_json).decode('utf-8'))
-        elif os.path.exists('credentials.json'):
-            # Fall back to file (for local development)
-            with open('credentials.json', 'r') as f:
-                credentials_data = json.load(f)
-        else:
+        credentials_data = GOOGLE_CREDENTIALS
+        if not credentials_data:
             return jsonify({'error': 'Google OAuth credentials not found. Please set GOOGLE_CREDENTIALS_JSON environment variable or provide credentials.json file.'}), 500
         
         # Create flow from credentials data
@@ -1004,17 +1461,18 @@ def connect_gmail():
             gmail_token = GmailToken.query.filter_by(user_id=current_user.id).first()
             if gmail_token:
                 gmail_token.encrypted_token = encrypted_token
+                gmail_token.email_address = None  # May be a different account
             else:
                 gmail_token = GmailToken(user_id=current_user.id, encrypted_token=encrypted_token)
                 db.session.add(gmail_token)
             
             db.session.commit()
+            forget_gmail_clients()
             
             # Redirect with parameter to trigger auto-fetch
             return redirect(url_for('dashboard') + '?connected=true')
     
     except Exception as e:
-        import traceback
         error_traceback = traceback.format_exc()
         print(f"❌ Error in connect_gmail: {str(e)}")
         print(f"Full traceback:\n{error_traceback}")
@@ -1029,7 +1487,6 @@ def connect_gmail():
 def handle_google_signup_callback(creds):
     """Handle Google OAuth callback for signup - create account and connect Gmail"""
     try:
-        from googleapiclient.discovery import build
         
         # Get user info from Google
         userinfo_service = build('oauth2', 'v2', credentials=creds)
@@ -1084,11 +1541,13 @@ def handle_google_signup_callback(creds):
         gmail_token = GmailToken.query.filter_by(user_id=current_user_obj.id).first()
         if gmail_token:
             gmail_token.encrypted_token = encrypted_token
+            gmail_token.email_address = None  # May be a different account
         else:
             gmail_token = GmailToken(user_id=current_user_obj.id, encrypted_token=encrypted_token)
             db.session.add(gmail_token)
         
         db.session.commit()
+        forget_gmail_clients()
         
         # Set up Pub/Sub if enabled
         use_pubsub = os.getenv('USE_PUBSUB', 'false').lower() == 'true'
@@ -1110,7 +1569,6 @@ def handle_google_signup_callback(creds):
         
         return redirect(url_for('dashboard') + '?auto_setup=true')
     except Exception as e:
-        import traceback
         traceback.print_exc()
         return f"Error in Google signup: {str(e)}", 500
 
@@ -1121,37 +1579,9 @@ def oauth2callback():
     """OAuth 2.0 callback handler for Railway/production"""
     try:
         # Clear any OAuth flow objects from session first (prevent serialization errors)
-        # BUT preserve oauth_state (it's a string, not an object)
-        keys_to_remove = []
-        oauth_state_backup = session.get('oauth_state')  # Backup state before cleanup
-        
-        for key in list(session.keys()):
-            # Skip oauth_state - we need to keep it
-            if key == 'oauth_state':
-                continue
-            # Check if value is not JSON serializable
-            try:
-                import json
-                json.dumps(session[key])
-            except (TypeError, ValueError):
-                keys_to_remove.append(key)
-            # Also remove OAuth flow keys (but not oauth_state)
-            if 'oauth' in key.lower() and 'flow' in key.lower() and key != 'oauth_state':
-                if key not in keys_to_remove:
-                    keys_to_remove.append(key)
-        
-        for key in keys_to_remove:
-            try:
-                session.pop(key, None)
-            except:
-                pass
+        # oauth_state is a plain string and is kept
+        drop_transient_session_keys()
         
-        # Restore oauth_state if it was removed
-        if 'oauth_state' not in session and oauth_state_backup:
-            session['oauth_state'] = oauth_state_backup
-        
-        from google_auth_oauthlib.flow import InstalledAppFlow
-        import json
         
         # Get state from session
         state = session.get('oauth_state')
@@ -1174,17 +1604,8 @@ def oauth2callback():
             return f"Invalid state parameter. Session state: {state}, Request state: {request_state}", 400
         
         # Get credentials from environment or file
-        credentials_json = os.getenv('GOOGLE_CREDENTIALS_JSON')
-        if credentials_json:
-            try:
-                credentials_data = json.loads(credentials_json)
-            except json.JSONDecodeError:
-                import base64
-                credentials_data = json.loads(base64.b64decode(credentials_json).decode('utf-8'))
-        elif os.path.exists('credentials.json'):
-            with open('credentials.json', 'r') as f:
-                credentials_data = json.load(f)
-        else:
+        credentials_data = GOOGLE_CREDENTIALS
+        if not credentials_data:
             return "Credentials not found", 500
         
         # Recreate flow
@@ -1201,7 +1622,6 @@ def oauth2callback():
             callback_url = callback_url.replace('http://', 'https://', 1)
         
         # Extract the actual redirect URI from the callback URL (base URL without query params)
-        from urllib.parse import urlparse, urlunparse
         parsed_callback = urlparse(callback_url)
         actual_redirect_uri = urlunparse((parsed_callback.scheme, parsed_callback.netloc, parsed_callback.path, '', '', ''))
         
@@ -1217,7 +1637,6 @@ def oauth2callback():
         
         # Extract authorization code FIRST (before any token exchange attempts)
         # This prevents the code from being consumed if flow.fetch_token() fails
-        from urllib.parse import urlparse, parse_qs
         parsed = urlparse(callback_url)
         params = parse_qs(parsed.query)
         auth_code = params.get('code', [None])[0]
@@ -1280,7 +1699,6 @@ def oauth2callback():
             raise Exception(f"Token exchange failed: {error_msg}")
         
         # Create credentials from token response
-        from google.oauth2.credentials import Credentials
         creds = Credentials(
             token=token_response['access_token'],
             refresh_token=token_response.get('refresh_token'),
@@ -1303,7 +1721,6 @@ def oauth2callback():
         # This handles the case where session doesn't persist through OAuth redirect
         if not is_signup and not current_user.is_authenticated:
             try:
-                from googleapiclient.discovery import build
                 userinfo_service = build('oauth2', 'v2', credentials=creds)
                 user_info = userinfo_service.userinfo().get().execute()
                 email = user_info.get('email')
@@ -1350,11 +1767,13 @@ def oauth2callback():
         gmail_token = GmailToken.query.filter_by(user_id=current_user.id).first()
         if gmail_token:
             gmail_token.encrypted_token = encrypted_token
+            gmail_token.email_address = None  # May be a different account
         else:
             gmail_token = GmailToken(user_id=current_user.id, encrypted_token=encrypted_token)
             db.session.add(gmail_token)
         
             db.session.commit()
+        forget_gmail_clients()
         
         # Set up Pub/Sub immediately when Gmail is connected (not waiting for setup completion)
         use_pubsub = os.getenv('USE_PUBSUB', 'false').lower() == 'true'
@@ -1397,7 +1816,6 @@ def oauth2callback():
             return redirect(url_for('dashboard') + '?connected=true')
     
     except Exception as e:
-        import traceback
         traceback.print_exc()
         return f"Error completing OAuth: {str(e)}", 500
 
@@ -1412,6 +1830,7 @@ def disconnect_gmail():
         if current_user.gmail_token:
             db.session.delete(current_user.gmail_token)
             db.session.commit()
+            forget_gmail_clients()
             print(f"✅ Disconnected Gmail for user {current_user.id}")
         
         # Return JSON for API calls, redirect for form submissions
@@ -1451,20 +1870,25 @@ def trigger_email_sync():
     try:
         from celery_config import celery
         
-        # Check if workers are actually running by inspecting active workers (with timeout)
-        try:
-            inspect = celery.control.inspect(timeout=2.0)  # 2 second timeout to prevent hanging
-            active_workers = inspect.active()
-            if not active_workers:
-                # No workers available - return 503 to trigger fallback
-                return jsonify({
-                    'success': False,
-                    'error': 'No Celery workers available. Please use /api/emails endpoint.'
-                }), 503
-        except Exception as worker_check_error:
-            # If we can't check workers, still try to queue the task
-            # Frontend will timeout and fall back if worker isn't running
-            print(f"⚠️  Could not check worker status: {worker_check_error}")
+        # Check if workers are actually running by inspecting active workers (with timeout),
+        # unless a recent check already found them
+        global _workers_seen_at
+        if _workers_seen_at is None or time.monotonic() - _workers_seen_at > WORKER_CHECK_TTL:
+            try:
+                inspect = celery.control.inspect(timeout=2.0)  # 2 second timeout to prevent hanging
+                active_workers = inspect.active()
+                if not active_workers:
+                    # No workers available - return 503 to trigger fallback
+                    _workers_seen_at = None
+                    return jsonify({
+                        'success': False,
+                        'error': 'No Celery workers available. Please use /api/emails endpoint.'
+                    }), 503
+                _workers_seen_at = time.monotonic()
+            except Exception as worker_check_error:
+                # If we can't check workers, still try to queue the task
+                # Frontend will timeout and fall back if worker isn't running
+                print(f"⚠️  Could not check worker status: {worker_check_error}")
         
         # Get parameters
         max_emails = min(request.json.get('max', 50), 200)  # Cap at 200
@@ -1482,7 +1906,7 @@ def trigger_email_sync():
             'task_id': task.id,
             'message': 'Email sync started in background',
             'status': 'PENDING'
-        })
+        }), 202
         
     except Exception as e:
         return jsonify({
@@ -1520,7 +1944,7 @@ def check_workers_status():
             from celery_config import celery
             celery.control.broadcast('ping', reply=True, timeout=1)
             redis_connected = True
-        except:
+        except Exception:
             pass
         
         return jsonify({
@@ -1775,8 +2199,28 @@ def get_emails():
         print(f"🔒 [SECURITY] Loading emails for user_id={user_id} (username={username})")
         
         print(f"   (Ignoring 'unread_only' filter - database doesn't track read status)")
-        query = EmailClassification.query.filter_by(user_id=user_id)
-
+        # Project only the columns the response uses (skips extracted_links and other unused text)
+        query = db.session.query(
+            EmailClassification.message_id,
+            EmailClassification.thread_id,
+            EmailClassification.subject,
+            EmailClassification.subject_encrypted,
+            EmailClassification.sender,
+            EmailClassification.snippet,
+            EmailClassification.snippet_encrypted,
+            EmailClassification.email_date,
+            EmailClassification.classified_at,
+            EmailClassification.category,
+            EmailClassification.tags,
+            EmailClassification.confidence,
+            EmailClassification.reply_type,
+            EmailClassification.deal_state,
+            EmailClassification.deck_link
+        ).filter_by(user_id=user_id)
+
+        # Filter in SQL so every returned row is one the UI shows
+        if not show_spam:
+            query = query.filter(EmailClassification.category != CATEGORY_SPAM)
         if category_filter:
             query = query.filter_by(category=category_filter)
 
@@ -1788,64 +2232,28 @@ def get_emails():
         star_status_map = {}
         if message_ids and gmail and getattr(gmail, 'service', None):
             try:
-                from googleapiclient.http import BatchHttpRequest
-                star_status_results = {}
-
-                def star_callback(request_id, response, exception):
-                    if exception:
-                        return
-                    if response:
-                        msg_id = request_id.split('_', 2)[-1] if '_' in request_id else request_id
-                        label_ids = response.get('labelIds', [])
-                        star_status_results[msg_id] = {
-                            'is_starred': 'STARRED' in label_ids,
-                            'label_ids': label_ids if isinstance(label_ids, list) else []
-                        }
-
-                BATCH_SIZE = 100
-                message_ids_to_fetch = message_ids[:200]
-
-                for chunk_start in range(0, len(message_ids_to_fetch), BATCH_SIZE):
-                    chunk = message_ids_to_fetch[chunk_start:chunk_start + BATCH_SIZE]
-                    batch = gmail.service.new_batch_http_request(callback=star_callback)
-
-                    for idx, msg_id in enumerate(chunk):
-                        batch.add(gmail.service.users().messages().get(
-                            userId='me',
-                            id=msg_id,
-                            format='metadata'
-                        ), request_id=f"star_{chunk_start + idx}_{msg_id}")
-
-                    if chunk:
-                        batch.execute()
-
-                star_status_map = star_status_results
+                star_status_map = batch_fetch_label_ids(gmail, message_ids)
                 print(f"⭐ Fetched star status for {len(star_status_map)} emails from Gmail")
             except Exception as e:
                 print(f"⚠️  Could not batch fetch star status: {str(e)}")
 
         for classification in db_classifications:
-            if classification.category == CATEGORY_SPAM and not show_spam:
-                continue
-
-            if category_filter and classification.category != category_filter:
-                continue
-
             star_info = star_status_map.get(classification.message_id, {'is_starred': False, 'label_ids': []})
 
             email_data = {
                 'id': classification.message_id,
                 'thread_id': classification.thread_id,
-                'subject': classification.get_subject_decrypted() or 'No Subject',
+                # Rows are named tuples, so the model's decrypt helpers read them unbound
+                'subject': EmailClassification.get_subject_decrypted(classification) or 'No Subject',
                 'from': classification.sender or 'Unknown',
-                'snippet': classification.get_snippet_decrypted() or '',
+                'snippet': EmailClassification.get_snippet_decrypted(classification) or '',
                 'date': classification.email_date or (int(classification.classified_at.timestamp() * 1000) if classification.classified_at else None),
                 'is_starred': star_info['is_starred'],
                 'is_read': 'UNREAD' not in star_info['label_ids'],
                 'label_ids': star_info['label_ids'],
                 'classification': {
                     'category': classification.category,
-                    'tags': classification.tags.split(',') if classification.tags else [],
+                    'tags': classification.tags or [],
                     'confidence': classification.confidence,
                     'reply_type': classification.reply_type,
                     'deal_state': classification.deal_state,
@@ -1897,9 +2305,11 @@ def get_emails():
                 print(f"🔄 Force full sync requested. Ignoring history_id...")
                 start_history_id = None
             else:
-                # Check if user has any classified emails
-                existing_classifications = EmailClassification.query.filter_by(user_id=current_user.id).count()
-                if existing_classifications == 0 and start_history_id:
+                # Check if user has any classified emails (EXISTS stops at the first row)
+                has_classifications = start_history_id and db.session.query(
+                    EmailClassification.query.filter_by(user_id=current_user.id).exists()
+                ).scalar()
+                if start_history_id and not has_classifications:
                     print(f"⚠️  Database is empty but historyId exists. Forcing full sync...")
                     start_history_id = None  # Force full sync
             
@@ -1918,10 +2328,12 @@ def get_emails():
                     print(f"🔄 Incremental sync: Fetching all new emails (no limit)")
                 
                 # Use incremental sync if we have a history_id (90%+ reduction in API calls!)
+                # Attachments are only listed here; content is fetched below for emails that need classifying
                 emails, new_history_id = gmail.get_emails(
                     max_results=gmail_max_results, 
                     unread_only=unread_only,
-                    start_history_id=start_history_id
+                    start_history_id=start_history_id,
+                    extract_attachments=False
                 )
                 
                 # Store new history_id for next sync
@@ -1949,7 +2361,6 @@ def get_emails():
                                 db.session.commit()
                             
                             # Trigger background sync with updated history_id
-                            from tasks import sync_user_emails
                             task = sync_user_emails.delay(
                                 user_id=current_user.id,
                                 max_emails=200,  # This will be ignored for incremental sync
@@ -1962,14 +2373,13 @@ def get_emails():
                         print(f"⚠️  Could not check history_id or trigger background sync: {str(sync_error)}")
                         # Fallback: trigger sync anyway
                         try:
-                            from tasks import sync_user_emails
                             task = sync_user_emails.delay(
                                 user_id=current_user.id,
                                 max_emails=200,
                                 force_full_sync=False
                             )
                             print(f"✅ Background sync triggered (fallback): {task.id}")
-                        except:
+                        except Exception:
                             pass
                 
             except Exception as e:
@@ -1977,8 +2387,7 @@ def get_emails():
                 # Check for rate limit errors
                 if '429' in error_str or 'rateLimitExceeded' in error_str or 'rate limit' in error_str.lower():
                     # Extract retry-after time if available
-                    import re
-                    retry_after_match = re.search(r'Retry after ([^\\n]+)', error_str)
+                    retry_after_match = RETRY_AFTER_RE.search(error_str)
                     retry_after = retry_after_match.group(1) if retry_after_match else 'a few minutes'
                     
                     return jsonify({
@@ -1998,46 +2407,91 @@ def get_emails():
         # Track if we've hit OpenAI quota/rate limit - if so, skip OpenAI calls for rest of batch
         openai_quota_exceeded = False
         
-        # Import time for rate limiting
-        import time
+        # Rule results by content hash + rule-relevant headers, so identical copies of an
+        # email in one sync (newsletters sent to several aliases) are only scanned once
+        deterministic_outcomes = {}
+        
+        def deterministic_result(entry):
+            """Classify a prepared email without a model call"""
+            key = (entry['content_hash'], classifier.deterministic_header_key(entry['headers']))
+            if entry['content_hash'] is None or key not in deterministic_outcomes:
+                deterministic_outcomes[key] = classifier.deterministic_classify(
+                    subject=entry['email'].get('subject', ''),
+                    body=entry['email_body_full'],
+                    headers=entry['headers'],
+                    sender=entry['email'].get('from', ''),
+                    links=entry['links'],
+                    has_pdf_attachment=entry['has_pdf_deck']
+                )
+            det_category, det_confidence = deterministic_outcomes[key]
+            # Determine tags based on category
+            tags = list(DETERMINISTIC_TAGS.get(det_category, ()))
+            
+            return {
+                'category': det_category,
+                'confidence': det_confidence,
+                'tags': tags,
+                'links': entry['links']
+            }
         
-        classified_emails = []
-        for idx, email in enumerate(emails):
-            # Rate limiting: Add small delay between OpenAI calls to avoid hitting rate limits
-            # Skip delay for first email and if quota already exceeded
-            if idx > 0 and not openai_quota_exceeded:
-                time.sleep(0.5)  # 500ms delay between requests (allows ~120 requests/minute)
+        # Pass 1: extract context for every email and resolve what we can without the model
+        prepared = []
+        pending = []  # Entries that need a model classification
+        
+        # Look up existing classifications and deals for all threads in two queries
+        thread_ids = list({e['thread_id'] for e in emails})
+        existing_classifications = {}
+        existing_deals = {}
+        if thread_ids:
+            existing_classifications = {c.thread_id: c for c in EmailClassification.query.filter(
+                EmailClassification.user_id == current_user.id,
+                EmailClassification.thread_id.in_(thread_ids)
+            ).all()}
+            existing_deals = {d.thread_id: d for d in Deal.query.filter(
+                Deal.user_id == current_user.id,
+                Deal.thread_id.in_(thread_ids)
+            ).all()}
+        
+        # Download attachments for every email that still needs classifying in batched Gmail calls
+        # (already-classified threads skip the download and parsing entirely)
+        try:
+            gmail.extract_attachment_texts([e for e in emails if e['thread_id'] not in existing_classifications])
+        except Exception as e:
+            print(f"⚠️  Could not extract attachments: {str(e)}")
+        
+        for email in emails:
             try:
                 # Check if already classified
-                classification = EmailClassification.query.filter_by(
-                    user_id=current_user.id,
-                    thread_id=email['thread_id']
-                ).first()
+                classification = existing_classifications.get(email['thread_id'])
+                
+                # Already-classified emails (the steady state on refresh) are served from their
+                # stored row by respond_with_database_emails; nothing below applies to them
+                if classification:
+                    continue
                 
                 # Check if this thread is part of a Deal Flow (even if this specific email isn't classified yet)
-                existing_deal = Deal.query.filter_by(
-                    user_id=current_user.id,
-                    thread_id=email['thread_id']
-                ).first()
+                existing_deal = existing_deals.get(email['thread_id'])
                 
                 # IMPORTANT: Extract PDF/attachment content FIRST, before classification
                 # This ensures we can detect PDF decks as deal flow indicators
+                # (attachments were downloaded above, only for threads that are not classified yet)
                 attachment_text = None
                 attachments = email.get('attachments', [])
                 pdf_attachments = []
                 if attachments:
-                    print(f"📎 Found {len(attachments)} attachment(s) in email {email.get('thread_id', 'unknown')} - extracting for classification")
+                    if not MINIMAL_LOGGING:
+                        print(f"📎 Found {len(attachments)} attachment(s) in email {email.get('thread_id', 'unknown')} - extracting for classification")
                     # Combine all attachment texts
-                    attachment_texts = [att.get('text', '') for att in attachments if att.get('text')]
-                    if attachment_texts:
-                        attachment_text = '\n\n'.join(attachment_texts)
+                    attachment_text = join_attachment_texts(attachments)
                     # Find PDF attachments
                     pdf_attachments = [att for att in attachments if att.get('mime_type') == 'application/pdf']
-                    print(f"📄 Found {len(pdf_attachments)} PDF attachment(s)")
+                    if not MINIMAL_LOGGING:
+                        print(f"📄 Found {len(pdf_attachments)} PDF attachment(s)")
                 
                 # Use combined_text (body + attachments) for link extraction and classification
                 # This ensures PDF deck content is analyzed before classifying
-                email_body_full = email.get('combined_text') or email.get('body', '')
+                combined_body = email.get('combined_text') or email.get('body') or ''
+                email_body_full = combined_body
                 if attachment_text and '--- Attachment Content ---' not in email_body_full:
                     # Add attachment content if not already included
                     email_body_full = f"{email_body_full}\n\n--- Attachment Content ---\n\n{attachment_text}"
@@ -2046,388 +2500,314 @@ def get_emails():
                 headers = email.get('headers', {})
                 links = classifier.extract_links(email_body_full)  # Extract links from full body including PDF
                 
-                # Check if PDF attachments indicate deal flow (PDF deck is a strong indicator)
+                # Any PDF attachment counts as a deal flow indicator (PDF deck is a strong indicator)
                 has_pdf_deck = len(pdf_attachments) > 0
-                if has_pdf_deck:
-                    # Check if PDF filename or content suggests it's a pitch deck
-                    for pdf_att in pdf_attachments:
-                        filename = pdf_att.get('filename', '').lower()
-                        if any(keyword in filename for keyword in ['deck', 'pitch', 'presentation', 'proposal', 'business']):
-                            has_pdf_deck = True
-                            break
-                        # Also check if PDF text content suggests it's a pitch deck
-                        pdf_text = pdf_att.get('text', '')
-                        if pdf_text:
-                            deck_indicators = ['pitch', 'deck', 'fundraising', 'investment', 'valuation', 'traction', 'market opportunity', 'team', 'round', 'seed', 'series']
-                            if any(indicator in pdf_text.lower()[:1000] for indicator in deck_indicators):
-                                has_pdf_deck = True
-                                break
                 
-                # Only classify if not already classified
+                entry = {
+                    'email': email,
+                    'attachment_text': attachment_text,
+                    'pdf_attachments': pdf_attachments,
+                    'combined_body': combined_body,
+                    'email_body_full': email_body_full,
+                    'headers': headers,
+                    'links': links,
+                    'has_pdf_deck': has_pdf_deck,
+                    'result': None,
+                    'content_hash': None
+                }
+                
+                # Only classify if not already classified (handled above)
                 # (Removed old reclassification logic to avoid burning OpenAI credits on every refresh)
-                if not classification:
-                    # Classify email with full context (including PDF decks)
-                    # If thread has an existing Deal, classify as Deal Flow
-                    if existing_deal:
-                        classification_result = {
-                            'category': CATEGORY_DEAL_FLOW,
-                            'confidence': 0.95,
-                            'tags': [TAG_DEAL],
-                            'links': links
-                        }
+                # If thread has an existing Deal, classify as Deal Flow
+                if existing_deal:
+                    entry['result'] = {
+                        'category': CATEGORY_DEAL_FLOW,
+                        'confidence': 0.95,
+                        'tags': [TAG_DEAL],
+                        'links': links
+                    }
+                else:
+                    # Reuse a previous result for identical content (resent/forwarded
+                    # emails, newsletters) instead of calling the classifier again
+                    entry['content_hash'] = classification_content_hash(
+                        email.get('subject', ''), email.get('from', ''), email_body_full, has_pdf_deck, headers
+                    )
+                    cached = ClassificationCache.query.get(entry['content_hash'])
+                    if cached:
+                        entry['result'] = {
+                            'category': cached.category,
+                            'confidence': cached.confidence,
+                            'tags': list(cached.tags or []),
+                            'links': links
+                        }
                     else:
-                        # If OpenAI quota exceeded, skip OpenAI and use deterministic only
-                        if openai_quota_exceeded:
-                            # Use deterministic classification directly (no OpenAI call)
-                            det_category, det_confidence = classifier.deterministic_classify(
-                                subject=email.get('subject', ''),
-                                body=email_body_full,
-                                headers=headers,
-                                sender=email.get('from', ''),
-                                links=links,
-                                has_pdf_attachment=has_pdf_deck
-                            )
-                            # Determine tags based on category
-                            tags = []
-                            if det_category == CATEGORY_DEAL_FLOW:
-                                tags = [TAG_DEAL]
-                            elif det_category == CATEGORY_NETWORKING:
-                                tags = [TAG_NETWORKING]
-                            elif det_category == CATEGORY_HIRING:
-                                tags = [TAG_HIRING]
-                            elif det_category == CATEGORY_SPAM:
-                                tags = [TAG_SPAM]
-                            elif det_category == CATEGORY_GENERAL:
-                                tags = [TAG_GENERAL]
-                            
-                            classification_result = {
-                                'category': det_category,
-                                'confidence': det_confidence,
-                                'tags': tags,
-                                'links': links
-                            }
-                        else:
-                            try:
-                                # Rate limit concurrent classifications to prevent 429 errors
-                                with CLASSIFICATION_SEMAPHORE:
-                                    classification_result = classifier.classify_email(
-                                        subject=email.get('subject', ''),
-                                        body=email_body_full,  # Includes PDF content
-                                        headers=headers,
-                                        sender=email.get('from', ''),
-                                        links=links,
-                                        has_pdf_attachment=has_pdf_deck,  # Pass PDF indicator
-                                        thread_id=email.get('thread_id'),
-                                        user_id=str(current_user.id)
-                                    )
-                            except Exception as classify_error:
-                                # If classification fails (e.g., OpenAI quota/rate limit), use deterministic only
-                                error_str = str(classify_error)
-                                # Check for both quota and rate limit errors (429 can show "insufficient_quota" in message)
-                                is_rate_limit = '429' in error_str or 'rate_limit' in error_str.lower() or 'rate limit' in error_str.lower()
-                                is_quota_error = 'insufficient_quota' in error_str.lower() or ('quota' in error_str.lower() and 'exceeded' in error_str.lower())
-                                
-                                if is_rate_limit or is_quota_error:
-                                    # Set flag to skip OpenAI for rest of batch
-                                    if not openai_quota_exceeded:
-                                        if is_rate_limit:
-                                            print(f"⚠️ OpenAI rate limit hit (429). Switching to deterministic-only classification for remaining emails.")
-                                            print(f"   Tip: Wait a few minutes or reduce batch size to avoid rate limits.")
-                                        else:
-                                            print(f"⚠️ OpenAI quota exceeded. Switching to deterministic-only classification for remaining emails.")
-                                        openai_quota_exceeded = True
-                                    
-                                    # Use deterministic classification directly
-                                    det_category, det_confidence = classifier.deterministic_classify(
-                                        subject=email.get('subject', ''),
-                                        body=email_body_full,
-                                        headers=headers,
-                                        sender=email.get('from', ''),
-                                        links=links,
-                                        has_pdf_attachment=has_pdf_deck
-                                    )
-                                    # Determine tags based on category
-                                    tags = []
-                                    if det_category == CATEGORY_DEAL_FLOW:
-                                        tags = [TAG_DEAL]
-                                    elif det_category == CATEGORY_NETWORKING:
-                                        tags = [TAG_NETWORKING]
-                                    elif det_category == CATEGORY_HIRING:
-                                        tags = [TAG_HIRING]
-                                    elif det_category == CATEGORY_SPAM:
-                                        tags = [TAG_SPAM]
-                                    elif det_category == CATEGORY_GENERAL:
-                                        tags = [TAG_GENERAL]
-                                    
-                                    classification_result = {
-                                        'category': det_category,
-                                        'confidence': det_confidence,
-                                        'tags': tags,
-                                        'links': links
-                                    }
-                                else:
-                                    # Re-raise other errors
-                                    raise
-                    
-                    # Check if email already exists (prevent duplicates)
-                    existing_classification = EmailClassification.query.filter_by(
-                        user_id=current_user.id,
-                        message_id=email['id']
-                    ).first()
+                        pending.append(entry)
+                
+                prepared.append(entry)
+            
+            except Exception as e:
+                print(f"Error processing email {email.get('thread_id', 'unknown')}: {str(e)}")
+                traceback.print_exc()
+                # Continue processing other emails
+                continue
+        
+        # Pass 2: classify uncached emails CLASSIFY_BATCH_SIZE at a time, one model call per batch,
+        # with up to CLASSIFY_WORKERS batches in flight
+        user_id_for_lambda = str(current_user.id)
+        
+        def classify_pending_batch(batch):
+            """Classify one batch (runs on a worker thread - no DB or request access here)"""
+            # Rate limit concurrent classifications to prevent 429 errors
+            with CLASSIFICATION_SEMAPHORE:
+                return classifier.classify_batch([
+                    {
+                        'subject': entry['email'].get('subject', ''),
+                        'body': entry['email_body_full'],  # Includes PDF content
+                        'headers': entry['headers'],
+                        'sender': entry['email'].get('from', ''),
+                        'links': entry['links'],
+                        'has_pdf_attachment': entry['has_pdf_deck'],  # Pass PDF indicator
+                        'thread_id': entry['email'].get('thread_id')
+                    }
+                    for entry in batch
+                ], user_id=user_id_for_lambda)
+        
+        batches = [pending[start:start + CLASSIFY_BATCH_SIZE] for start in range(0, len(pending), CLASSIFY_BATCH_SIZE)]
+        with ThreadPoolExecutor(max_workers=CLASSIFY_WORKERS) as executor:
+            futures = {executor.submit(classify_pending_batch, batch): batch for batch in batches}
+            for future in as_completed(futures):
+                batch = futures[future]
+                
+                # If OpenAI quota exceeded, batches that never started use deterministic only
+                if future.cancelled():
+                    for entry in batch:
+                        entry['result'] = deterministic_result(entry)
+                    continue
+                
+                try:
+                    results = future.result()
                     
-                    if existing_classification:
-                        # If already processed, skip entirely (no re-classification, no PDF extraction)
-                        if existing_classification.processed:
-                            print(f"⏭️  Email {email['id']} already processed, skipping...")
+                    for entry, classification_result in zip(batch, results):
+                        entry['result'] = classification_result
+                        # Only cache what the model labeled; after a fallback (failed call, id
+                        # missing from the response) identical emails still go to the model
+                        if not classification_result.get('model_labeled'):
                             continue
-                        # Update existing classification instead of creating duplicate
-                        classification = existing_classification
-                        classification.category = classification_result['category']
-                        classification.tags = ','.join(classification_result['tags'])
-                        classification.confidence = classification_result['confidence']
-                        classification.extracted_links = json.dumps(classification_result['links'])
-                        classification.sender = email.get('from', 'Unknown')
-                        classification.email_date = email.get('date')
-                        # Update encrypted fields
-                        classification.set_subject_encrypted(email.get('subject', 'No Subject'))
-                        classification.set_snippet_encrypted(email.get('snippet', ''))
-                    else:
-                        # Create new classification
-                        classification = EmailClassification(
-                            user_id=current_user.id,
-                            thread_id=email['thread_id'],
-                            message_id=email['id'],
-                            sender=email.get('from', 'Unknown'),
-                            email_date=email.get('date'),
+                        # Committed once all batches finish
+                        db.session.merge(ClassificationCache(
+                            content_hash=entry['content_hash'],
                             category=classification_result['category'],
-                            tags=','.join(classification_result['tags']),
-                            confidence=classification_result['confidence'],
-                            extracted_links=json.dumps(classification_result['links'])
-                        )
-                        # PRIORITY 2: Use encrypted field setters
-                        classification.set_subject_encrypted(email.get('subject', 'No Subject'))
-                        classification.set_snippet_encrypted(email.get('snippet', ''))
+                            tags=list(classification_result['tags']),
+                            confidence=classification_result['confidence']
+                        ))
+                except Exception as classify_error:
+                    # If classification fails (e.g., OpenAI quota/rate limit), use deterministic only
+                    error_str = str(classify_error)
+                    # Check for both quota and rate limit errors (429 can show "insufficient_quota" in message)
+                    is_rate_limit = '429' in error_str or 'rate_limit' in error_str.lower() or 'rate limit' in error_str.lower()
+                    is_quota_error = 'insufficient_quota' in error_str.lower() or ('quota' in error_str.lower() and 'exceeded' in error_str.lower())
                     
-                    # Deal Flow specific processing
-                    if classification_result['category'] == CATEGORY_DEAL_FLOW:
-                        deck_links = [l for l in classification_result['links'] if any(
-                            ind in l.lower() for ind in ['docsend', 'dataroom', 'deck', 'drive.google.com', 'dropbox.com', 'notion.so']
-                        )]
-                        
-                        # Attachment text already extracted above for classification
-                        # Mark PDF attachments as deck links
-                        if pdf_attachments:
-                            pdf_filename = pdf_attachments[0].get('filename', 'deck.pdf')
-                            if not deck_links:
-                                classification.deck_link = f"[PDF Attachment: {pdf_filename}]"
-                                print(f"✓ Marked PDF attachment as deck: {pdf_filename}")
+                    if is_rate_limit or is_quota_error:
+                        # Stop dispatching OpenAI calls for the rest of the sync
+                        if not openai_quota_exceeded:
+                            if is_rate_limit:
+                                print(f"⚠️ OpenAI rate limit hit (429). Switching to deterministic-only classification for remaining emails.")
+                                print(f"   Tip: Wait a few minutes or reduce batch size to avoid rate limits.")
                             else:
-                                # Even if there are deck links, also note PDF attachment
-                                if not classification.deck_link or '[PDF Attachment' not in classification.deck_link:
-                                    classification.deck_link = f"{deck_links[0]} (+ {pdf_filename})"
-                        
-                        if deck_links and not classification.deck_link:
-                            classification.deck_link = deck_links[0]
+                                print(f"⚠️ OpenAI quota exceeded. Switching to deterministic-only classification for remaining emails.")
+                            openai_quota_exceeded = True
+                            for pending_future in futures:
+                                pending_future.cancel()
                         
-                        # Check four basics (include attachment text)
-                        # Use combined_text for checking basics
-                        email_body_for_basics = email.get('combined_text') or email.get('body', '')
-                        basics = classifier.check_four_basics(
-                            email.get('subject', ''),
-                            email_body_for_basics,
-                            classification_result['links'],
-                            attachment_text=attachment_text
-                        )
-                        
-                        # Extract founder info
-                        founder_email = email.get('from', '').split('<')[1].split('>')[0] if '<' in email.get('from', '') else email.get('from', '')
-                        founder_name = email.get('from', '').split('<')[0].strip() if '<' in email.get('from', '') else ''
-                        
-                        # Scoring system removed - using NA placeholders
-                        # Generate reply and determine state (without scores)
-                        # Use combined_text for reply generation to include attachment context
-                        reply_body = email.get('combined_text') or email.get('body', '')
-                        reply_text, reply_type, state = classifier.generate_deal_flow_reply(
-                            basics, 
-                            bool(deck_links) or bool(attachment_text),
-                            subject=email.get('subject', ''),
-                            body=reply_body,
-                            sender=email.get('from', ''),
-                            score=None,  # No scoring
-                            team_score=None,
-                            white_space_score=None
-                        )
-                        
-                        # Clean up any signature placeholder text the AI might have added
-                        placeholder_phrases = [
-                            '[Your Name]', '[Your Position]', '[Your Firm]', '[Your Contact Information]'
-                        ]
-                        for phrase in placeholder_phrases:
-                            if phrase in reply_text:
-                                # Remove the placeholder and everything after it
-                                idx = reply_text.find(phrase)
-                                reply_text = reply_text[:idx].strip()
-                                break
-                        
-                        # Append signature to generated reply
-                        try:
-                            selected_email = current_user.gmail_token.selected_signature_email if current_user.gmail_token else None
-                            signature = gmail.get_signature(send_as_email=selected_email)
-                            if signature:
-                                reply_text = f"{reply_text}\n\n{signature}"
-                        except Exception as e:
-                            print(f"Note: Could not fetch signature during classification: {str(e)}")
-                        
-                        classification.deal_state = state
-                        classification.reply_type = reply_type
-                        
-                        # Add classification first to get its ID
-                        db.session.add(classification)
-                        db.session.flush()  # Get classification.id
-                        
-                        # Determine deck_link for Deal record (use classification.deck_link which includes PDF attachments)
-                        deal_deck_link = classification.deck_link if classification.deck_link else (deck_links[0] if deck_links else None)
-                        
-                        # Create Deal record (scoring system removed - using NA placeholders)
-                        deal = Deal(
+                        for entry in batch:
+                            entry['result'] = deterministic_result(entry)
+                    else:
+                        # Leave these emails unclassified; they are retried on the next sync
+                        print(f"Error classifying batch of {len(batch)} emails: {error_str}")
+        
+        # Commit cache rows on their own, so a concurrent insert of the same hash
+        # cannot roll back the email writes below
+        if pending:
+            try:
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                print(f"⚠️  Could not save classification cache: {str(e)}")
+        
+        # Pass 3: persist classifications and run per-category processing
+        for entry in prepared:
+            email = entry['email']
+            try:
+                attachment_text = entry['attachment_text']
+                pdf_attachments = entry['pdf_attachments']
+                
+                classification_result = entry['result']
+                if classification_result is None:
+                    continue
+                
+                # Savepoint per email so a duplicate only undoes this email; the sync commits once below
+                try:
+                    with db.session.begin_nested():
+                        # Check if email already exists (prevent duplicates)
+                        existing_classification = EmailClassification.query.filter_by(
                             user_id=current_user.id,
-                            thread_id=email['thread_id'],
-                            classification_id=classification.id,
-                            founder_name=founder_name,
-                            founder_email=founder_email,
-                            subject=email.get('subject', ''),
-                            deck_link=deal_deck_link,
-                            has_deck=basics['has_deck'] or bool(deal_deck_link),
-                            has_team_info=basics['has_team_info'],
-                            has_traction=basics['has_traction'],
-                            has_round_info=basics['has_round_info'],
-                            state=state,
-                            # Team background (not extracted - scoring removed)
-                            founder_school=None,
-                            founder_previous_companies=None,
-                            # Scores set to None (scoring system removed)
-                            team_background_score=None,
-                            white_space_score=None,
-                            overall_score=None,
-                            # White space analysis removed
-                            white_space_analysis=None,
-                            # Old scores set to None (deprecated, kept for backward compatibility)
-                            risk_score=None,
-                            portfolio_comparison_score=None,
-                            founder_market_score=None,
-                            traction_score=None,
-                            # Keep portfolio_overlaps empty (not using old portfolio matching)
-                            portfolio_overlaps=json.dumps({})
-                        )
-                        db.session.add(deal)
-                        db.session.flush()  # Get deal.id
+                            message_id=email['id']
+                        ).first()
+                
+                        if existing_classification:
+                            # If already processed, skip entirely (no re-classification, no PDF extraction)
+                            if existing_classification.processed:
+                                print(f"⏭️  Email {email['id']} already processed, skipping...")
+                                continue
+                            # Update existing classification instead of creating duplicate
+                            classification = existing_classification
+                            classification.category = classification_result['category']
+                            classification.tags = list(classification_result['tags'])
+                            classification.confidence = classification_result['confidence']
+                            classification.extracted_links = list(classification_result['links'])
+                            classification.sender = email.get('from', 'Unknown')
+                            classification.email_date = email.get('date')
+                            # Update encrypted fields
+                            classification.set_subject_encrypted(email.get('subject', 'No Subject'))
+                            classification.set_snippet_encrypted(email.get('snippet', ''))
+                        else:
+                            # Create new classification
+                            classification = EmailClassification(
+                                user_id=current_user.id,
+                                thread_id=email['thread_id'],
+                                message_id=email['id'],
+                                sender=email.get('from', 'Unknown'),
+                                email_date=email.get('date'),
+                                category=classification_result['category'],
+                                tags=list(classification_result['tags']),
+                                confidence=classification_result['confidence'],
+                                extracted_links=list(classification_result['links'])
+                            )
+                            # PRIORITY 2: Use encrypted field setters
+                            classification.set_subject_encrypted(email.get('subject', 'No Subject'))
+                            classification.set_snippet_encrypted(email.get('snippet', ''))
+                
+                        # Deal Flow specific processing
+                        if classification_result['category'] == CATEGORY_DEAL_FLOW:
+                            deck_links = [l for l in classification_result['links'] if DECK_LINK_RE.search(l)]
                     
-                    # Other categories - generate appropriate reply
-                    elif classification_result['category'] in [CATEGORY_NETWORKING, CATEGORY_HIRING]:
-                        reply_text, reply_type = classifier.generate_category_reply(
-                            classification_result['category']
-                        )
-                        
-                        # Clean up any signature placeholder text the AI might have added
-                        placeholder_phrases = [
-                            '[Your Name]', '[Your Position]', '[Your Firm]', '[Your Contact Information]'
-                        ]
-                        for phrase in placeholder_phrases:
-                            if phrase in reply_text:
-                                # Remove the placeholder and everything after it
-                                idx = reply_text.find(phrase)
-                                reply_text = reply_text[:idx].strip()
-                                break
-                        
-                        # Append signature to generated reply
-                        try:
-                            selected_email = current_user.gmail_token.selected_signature_email if current_user.gmail_token else None
-                            signature = gmail.get_signature(send_as_email=selected_email)
-                            if signature:
-                                reply_text = f"{reply_text}\n\n{signature}"
-                        except Exception as e:
-                            print(f"Note: Could not fetch signature during classification: {str(e)}")
-                        
-                        classification.reply_type = reply_type
+                            # Attachment text already extracted above for classification
+                            # Mark PDF attachments as deck links
+                            if pdf_attachments:
+                                pdf_filename = pdf_attachments[0].get('filename', 'deck.pdf')
+                                if not deck_links:
+                                    classification.deck_link = f"[PDF Attachment: {pdf_filename}]"
+                                else:
+                                    # Even if there are deck links, also note PDF attachment
+                                    if not classification.deck_link or '[PDF Attachment' not in classification.deck_link:
+                                        classification.deck_link = f"{deck_links[0]} (+ {pdf_filename})"
                     
-                    else:  # SPAM
-                        classification.reply_type = 'none'
+                            if deck_links and not classification.deck_link:
+                                classification.deck_link = deck_links[0]
                     
-                    # Add classification if not already added (for non-Deal Flow cases)
-                    if classification_result['category'] != CATEGORY_DEAL_FLOW:
-                        db.session.add(classification)
+                            # Check four basics (include attachment text)
+                            # Use combined_text for checking basics
+                            basics = classifier.check_four_basics(
+                                email.get('subject', ''),
+                                entry['combined_body'],
+                                classification_result['links'],
+                                attachment_text=attachment_text
+                            )
                     
-                    # Commit with duplicate error handling (race condition protection)
-                    try:
-                        db.session.commit()
-                        # Mark as processed after successful commit (prevents re-processing)
-                        classification.processed = True
-                        db.session.commit()
-                    except Exception as commit_error:
-                        error_str = str(commit_error)
-                        # Handle duplicate key errors (unique constraint violation)
-                        if 'UniqueViolation' in error_str or 'duplicate key' in error_str.lower() or 'uq_user_message' in error_str:
-                            db.session.rollback()
-                            print(f"⏭️  Email {email['id']} was inserted by another process, fetching existing classification...")
-                            # Fetch the existing classification
-                            existing_classification = EmailClassification.query.filter_by(
+                            # Extract founder info
+                            raw_from = email.get('from', '') or ''
+                            founder_name, founder_email = parseaddr(raw_from)
+                            founder_email = founder_email or raw_from
+                    
+                            # Only the reply type and state are stored here; the reply text itself is
+                            # generated (with placeholder cleanup and signature) when the user opens it
+                            reply_type, state = classifier.deal_flow_reply_state(
+                                basics,
+                                bool(deck_links) or bool(attachment_text)
+                            )
+                    
+                            classification.deal_state = state
+                            classification.reply_type = reply_type
+                    
+                            # Determine deck_link for Deal record (use classification.deck_link which includes PDF attachments)
+                            deal_deck_link = classification.deck_link if classification.deck_link else (deck_links[0] if deck_links else None)
+                    
+                            # Create Deal record (scoring system removed - using NA placeholders)
+                            deal = Deal(
                                 user_id=current_user.id,
-                                message_id=email['id']
-                            ).first()
-                            if existing_classification:
-                                # Use existing classification instead
-                                classification = existing_classification
-                            else:
-                                # If we can't find it, skip this email
-                                print(f"⚠️  Could not find existing classification for email {email['id']}, skipping...")
-                                continue
-                        else:
-                            # Other errors - rollback and re-raise
-                            db.session.rollback()
-                            raise
-                
-                # Add classification info to email
-                email['classification'] = {
-                    'category': classification.category,
-                    'tags': classification.tags.split(',') if classification.tags else [],
-                    'confidence': classification.confidence,
-                    'reply_type': classification.reply_type,
-                    'deal_state': classification.deal_state,
-                    'deck_link': classification.deck_link
-                }
-                
-                # Ensure star status is included (from Gmail API)
-                if 'is_starred' not in email:
-                    email['is_starred'] = False
-                if 'label_ids' not in email:
-                    email['label_ids'] = []
-                
-                # Filter by category if requested
-                if category_filter and classification.category != category_filter:
-                    continue
+                                thread_id=email['thread_id'],
+                                classification=classification,  # classification_id is filled in on flush
+                                founder_name=founder_name,
+                                founder_email=founder_email,
+                                subject=email.get('subject', ''),
+                                deck_link=deal_deck_link,
+                                has_deck=basics['has_deck'] or bool(deal_deck_link),
+                                has_team_info=basics['has_team_info'],
+                                has_traction=basics['has_traction'],
+                                has_round_info=basics['has_round_info'],
+                                state=state,
+                                # Team background (not extracted - scoring removed)
+                                founder_school=None,
+                                founder_previous_companies=None,
+                                # Scores set to None (scoring system removed)
+                                team_background_score=None,
+                                white_space_score=None,
+                                overall_score=None,
+                                # White space analysis removed
+                                white_space_analysis=None,
+                                # Old scores set to None (deprecated, kept for backward compatibility)
+                                risk_score=None,
+                                portfolio_comparison_score=None,
+                                founder_market_score=None,
+                                traction_score=None
+                                # portfolio_overlaps defaults to empty (not using old portfolio matching)
+                            )
+                            db.session.add(deal)
                 
-                # Filter spam if not requested (but always show GENERAL)
-                if classification.category == CATEGORY_SPAM and not show_spam:
-                    continue
+                        # Other categories - generate appropriate reply
+                        elif classification_result['category'] in [CATEGORY_NETWORKING, CATEGORY_HIRING]:
+                            _, reply_type = classifier.generate_category_reply(
+                                classification_result['category']
+                            )
+                    
+                            classification.reply_type = reply_type
                 
-                # Debug: Log what we're appending (only if not in minimal logging mode)
-                if not MINIMAL_LOGGING:
-                    print(f"📧 Appending email from {email.get('from', 'unknown')[:50]}: Category={classification.category}, Subject={email.get('subject', 'No subject')[:50]}, Starred={email.get('is_starred', False)}")
+                        else:  # SPAM
+                            classification.reply_type = 'none'
                 
-                classified_emails.append(email)
-            
+                        # The savepoint flushes the classification (and its Deal) in one go
+                        db.session.add(classification)
+                        
+                        # Mark as processed in the same write (prevents re-processing)
+                        classification.processed = True
+                except Exception as commit_error:
+                    # The savepoint has already been rolled back; earlier emails stay pending
+                    error_str = str(commit_error)
+                    # Handle duplicate key errors (unique constraint violation)
+                    if 'UniqueViolation' in error_str or 'duplicate key' in error_str.lower() or 'uq_user_message' in error_str:
+                        # The other process's row is what the response will show
+                        print(f"⏭️  Email {email['id']} was inserted by another process, skipping...")
+                        continue
+                    else:
+                        raise
+        
             except Exception as e:
                 print(f"Error processing email {email.get('thread_id', 'unknown')}: {str(e)}")
-                import traceback
                 traceback.print_exc()
                 # Continue processing other emails
                 continue
         
+        # One commit for every email written above
+        try:
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Error saving classified emails: {str(e)}")
+        
         # After Gmail processing, always respond with the latest snapshot from the database
         return respond_with_database_emails()
     
     except Exception as e:
-        import traceback
         error_trace = traceback.format_exc()
         print(f"Error in get_emails: {str(e)}")
         print(error_trace)
@@ -2437,7 +2817,7 @@ def get_emails():
             print("⚠️  User has been deleted. Logging out user...")
             try:
                 logout_user()
-            except:
+            except Exception:
                 pass
             return jsonify({
                 'success': False, 
@@ -2522,19 +2902,24 @@ def stream_emails():
             openai_client = get_openai_client()
             classifier = EmailClassifier(openai_client)
             
-            import time
+            # Look up already-classified messages for the whole batch in one query
+            # (by message_id, which is more accurate than thread_id)
+            message_ids = [e['id'] for e in emails]
+            existing_by_message = {}
+            if message_ids:
+                existing_by_message = {c.message_id: c for c in EmailClassification.query.filter(
+                    EmailClassification.user_id == user_id,
+                    EmailClassification.message_id.in_(message_ids)
+                ).all()}
+            
             for idx, email in enumerate(emails):
-                # Rate limiting
-                if idx > 0:
+                existing_classification = existing_by_message.get(email['id'])
+                
+                # Rate limiting (only emails that reach the classifier need it)
+                if idx > 0 and not existing_classification:
                     time.sleep(0.5)
                 
                 try:
-                    # Check if already classified by message_id FIRST (more accurate than thread_id)
-                    existing_classification = EmailClassification.query.filter_by(
-                        user_id=user_id,
-                        message_id=email['id']
-                    ).first()
-                    
                     if existing_classification:
                         # Return existing classification
                         email_data = {
@@ -2548,7 +2933,7 @@ def stream_emails():
                             'label_ids': email.get('label_ids', []),
                             'classification': {
                                 'category': existing_classification.category,
-                                'tags': existing_classification.tags.split(',') if existing_classification.tags else [],
+                                'tags': existing_classification.tags or [],
                                 'confidence': existing_classification.confidence,
                                 'reply_type': existing_classification.reply_type,
                                 'deal_state': existing_classification.deal_state,
@@ -2589,7 +2974,7 @@ def stream_emails():
                             'label_ids': email.get('label_ids', []),
                             'classification': {
                                 'category': existing_classification.category,
-                                'tags': existing_classification.tags.split(',') if existing_classification.tags else [],
+                                'tags': existing_classification.tags or [],
                                 'confidence': existing_classification.confidence,
                                 'reply_type': existing_classification.reply_type,
                                 'deal_state': existing_classification.deal_state,
@@ -2605,9 +2990,9 @@ def stream_emails():
                             sender=email.get('from', 'Unknown'),
                             email_date=email.get('date'),
                             category=classification_result['category'],
-                            tags=','.join(classification_result['tags']),
+                            tags=list(classification_result['tags']),
                             confidence=classification_result['confidence'],
-                            extracted_links=json.dumps(classification_result['links'])
+                            extracted_links=list(classification_result['links'])
                         )
                         # PRIORITY 2: Use encrypted field setters
                         new_classification.set_subject_encrypted(email.get('subject', 'No Subject'))
@@ -2643,7 +3028,7 @@ def stream_emails():
                                         'label_ids': email.get('label_ids', []),
                                         'classification': {
                                             'category': existing_classification.category,
-                                            'tags': existing_classification.tags.split(',') if existing_classification.tags else [],
+                                            'tags': existing_classification.tags or [],
                                             'confidence': existing_classification.confidence,
                                             'reply_type': existing_classification.reply_type,
                                             'deal_state': existing_classification.deal_state,
@@ -2687,7 +3072,7 @@ def stream_emails():
                     # Rollback session on any error to prevent "session rolled back" errors
                     try:
                         db.session.rollback()
-                    except:
+                    except Exception:
                         pass
                     
                     # Check if it's a duplicate error (already handled above, but catch any edge cases)
@@ -3057,6 +3442,134 @@ def delete_draft(draft_id):
         }), 500
 
 
+def reclassify_fetched_email(user, classifier, email, thread_id, existing_deal=None):
+    """
+    Classify a fetched email again and stage its EmailClassification row.
+    The row is added to the session but not committed, so callers can commit
+    one email or a whole batch in a single transaction.
+    Returns (classification_row, classification_result).
+    """
+    headers = email.get('headers', {})
+    links = classifier.extract_links(email.get('body', ''))
+    
+    # IMPORTANT: Extract PDF/attachment content BEFORE classification
+    attachment_text = None
+    attachments = email.get('attachments', [])
+    pdf_attachments = []
+    if attachments:
+        print(f"📎 Found {len(attachments)} attachment(s) in email {email.get('thread_id', 'unknown')} - extracting for reclassification")
+        # Combine all attachment texts
+        attachment_text = join_attachment_texts(attachments)
+        # Find PDF attachments
+        pdf_attachments = [att for att in attachments if att.get('mime_type') == 'application/pdf']
+        print(f"📄 Found {len(pdf_attachments)} PDF attachment(s)")
+    
+    # Use combined_text (body + attachments) for classification
+    combined_body = email.get('combined_text') or email.get('body') or ''
+    email_body_for_classification = combined_body
+    if attachment_text and '--- Attachment Content ---' not in email_body_for_classification:
+        # Add attachment content if not already included
+        email_body_for_classification = f"{email_body_for_classification}\n\n--- Attachment Content ---\n\n{attachment_text}"
+    
+    if existing_deal:
+        classification_result = {
+            'category': CATEGORY_DEAL_FLOW,
+            'confidence': 0.95,
+            'tags': [TAG_DEAL],
+            'links': links
+        }
+    else:
+        # An explicit reclassify always asks the model again; the fresh result replaces the cached one
+        classification_result = classify_email_cached(
+            classifier,
+            subject=email.get('subject', ''),
+            body=email_body_for_classification,  # Includes PDF content
+            headers=headers,
+            sender=email.get('from', ''),
+            links=links,
+            thread_id=email.get('thread_id'),
+            user_id=str(user.id),
+            refresh=True,
+            commit=False
+        )
+    
+    # Check if email already exists (prevent duplicates)
+    existing_classification = EmailClassification.query.filter_by(
+        user_id=user.id,
+        message_id=email['id']
+    ).first()
+    
+    if existing_classification:
+        # Update existing classification instead of creating duplicate
+        new_classification = existing_classification
+        new_classification.category = classification_result['category']
+        new_classification.tags = list(classification_result['tags'])
+        new_classification.confidence = classification_result['confidence']
+        new_classification.extracted_links = list(classification_result['links'])
+        new_classification.sender = email.get('from', 'Unknown')
+        new_classification.email_date = email.get('date')
+        # Update encrypted fields
+        new_classification.set_subject_encrypted(email.get('subject', 'No Subject'))
+        new_classification.set_snippet_encrypted(email.get('snippet', ''))
+    else:
+        # Create new classification
+        new_classification = EmailClassification(
+            user_id=user.id,
+            thread_id=thread_id,
+            message_id=email['id'],
+            sender=email.get('from', 'Unknown'),
+            email_date=email.get('date'),
+            category=classification_result['category'],
+            tags=list(classification_result['tags']),
+            confidence=classification_result['confidence'],
+            extracted_links=list(classification_result['links'])
+        )
+        # PRIORITY 2: Use encrypted field setters
+        new_classification.set_subject_encrypted(email.get('subject', 'No Subject'))
+        new_classification.set_snippet_encrypted(email.get('snippet', ''))
+    
+    # Process Deal Flow if needed
+    if classification_result['category'] == CATEGORY_DEAL_FLOW:
+        deck_links = [l for l in classification_result['links'] if DECK_LINK_RE.search(l)]
+        
+        # Attachment text already extracted above for classification
+        # Mark PDF attachments as deck links
+        if pdf_attachments:
+            pdf_filename = pdf_attachments[0].get('filename', 'deck.pdf')
+            if not deck_links:
+                new_classification.deck_link = f"[PDF Attachment: {pdf_filename}]"
+                print(f"✓ Marked PDF attachment as deck: {pdf_filename}")
+            else:
+                # Even if there are deck links, also note PDF attachment
+                if not new_classification.deck_link or '[PDF Attachment' not in new_classification.deck_link:
+                    new_classification.deck_link = f"{deck_links[0]} (+ {pdf_filename})"
+        
+        if deck_links:
+            new_classification.deck_link = deck_links[0]
+        
+        # Use combined_text for checking basics
+        basics = classifier.check_four_basics(
+            email.get('subject', ''),
+            combined_body,
+            classification_result['links'],
+            attachment_text=attachment_text
+        )
+        
+        # Only the reply type and state are stored; the reply text itself is generated
+        # (with placeholder cleanup and signature) when the user opens the email
+        reply_type, state = classifier.deal_flow_reply_state(
+            basics,
+            bool(deck_links) or bool(attachment_text)
+        )
+        
+        new_classification.deal_state = state
+        new_classification.reply_type = reply_type
+    
+    new_classification.processed = True
+    db.session.add(new_classification)
+    return new_classification, classification_result
+
+
 @app.route('/api/reclassify-email', methods=['POST'])
 @login_required
 def reclassify_email():
@@ -3096,10 +3609,7 @@ def reclassify_email():
             return jsonify({'success': False, 'error': 'Email not found'}), 404
         
         # Reclassify
-        openai_client = get_openai_client()
-        classifier = EmailClassifier(openai_client)
-        headers = email.get('headers', {})
-        links = classifier.extract_links(email.get('body', ''))
+        classifier = EmailClassifier(get_openai_client())
         
         # Check if thread has existing Deal
         existing_deal = Deal.query.filter_by(
@@ -3107,167 +3617,83 @@ def reclassify_email():
             thread_id=thread_id
         ).first()
         
-        # IMPORTANT: Extract PDF/attachment content BEFORE classification
-        attachment_text = None
-        attachments = email.get('attachments', [])
-        pdf_attachments = []
-        if attachments:
-            print(f"📎 Found {len(attachments)} attachment(s) in email {email.get('thread_id', 'unknown')} - extracting for reclassification")
-            # Combine all attachment texts
-            attachment_texts = [att.get('text', '') for att in attachments if att.get('text')]
-            if attachment_texts:
-                attachment_text = '\n\n'.join(attachment_texts)
-            # Find PDF attachments
-            pdf_attachments = [att for att in attachments if att.get('mime_type') == 'application/pdf']
-            print(f"📄 Found {len(pdf_attachments)} PDF attachment(s)")
-        
-        # Use combined_text (body + attachments) for classification
-        email_body_for_classification = email.get('combined_text') or email.get('body', '')
-        if attachment_text and '--- Attachment Content ---' not in email_body_for_classification:
-            # Add attachment content if not already included
-            email_body_for_classification = f"{email_body_for_classification}\n\n--- Attachment Content ---\n\n{attachment_text}"
-        
-        if existing_deal:
-            classification_result = {
-                'category': CATEGORY_DEAL_FLOW,
-                'confidence': 0.95,
-                'tags': [TAG_DEAL],
-                'links': links
-            }
-        else:
-            # Rate limit concurrent classifications to prevent 429 errors
-            with CLASSIFICATION_SEMAPHORE:
-                classification_result = classifier.classify_email(
-                    subject=email.get('subject', ''),
-                    body=email_body_for_classification,  # Includes PDF content
-                    headers=headers,
-                    sender=email.get('from', ''),
-                    links=links,
-                    thread_id=email.get('thread_id'),
-                    user_id=str(current_user.id)
-                )
+        _, classification_result = reclassify_fetched_email(
+            current_user, classifier, email, thread_id, existing_deal=existing_deal
+        )
+        db.session.commit()
         
-        # Check if email already exists (prevent duplicates)
-        existing_classification = EmailClassification.query.filter_by(
-            user_id=current_user.id,
-            message_id=email['id']
-        ).first()
+        return jsonify({
+            'success': True,
+            'category': classification_result['category'],
+            'confidence': classification_result['confidence'],
+            'tags': classification_result['tags']
+        })
+    
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/reclassify-bulk', methods=['POST'])
+@login_required
+def reclassify_bulk():
+    """Force reclassification of several threads, committed in a single transaction"""
+    if not current_user.gmail_token:
+        return jsonify({'success': False, 'error': 'Gmail not connected'}), 400
+    
+    try:
+        data = request.json or {}
+        thread_ids = list(dict.fromkeys(data.get('thread_ids') or []))
         
-        if existing_classification:
-            # Update existing classification instead of creating duplicate
-            new_classification = existing_classification
-            new_classification.category = classification_result['category']
-            new_classification.tags = ','.join(classification_result['tags'])
-            new_classification.confidence = classification_result['confidence']
-            new_classification.extracted_links = json.dumps(classification_result['links'])
-            new_classification.sender = email.get('from', 'Unknown')
-            new_classification.email_date = email.get('date')
-            # Update encrypted fields
-            new_classification.set_subject_encrypted(email.get('subject', 'No Subject'))
-            new_classification.set_snippet_encrypted(email.get('snippet', ''))
-        else:
-            # Create new classification
-            new_classification = EmailClassification(
-                user_id=current_user.id,
-                thread_id=thread_id,
-                message_id=email['id'],
-                sender=email.get('from', 'Unknown'),
-                email_date=email.get('date'),
-                category=classification_result['category'],
-                tags=','.join(classification_result['tags']),
-                confidence=classification_result['confidence'],
-                extracted_links=json.dumps(classification_result['links'])
-            )
-            # PRIORITY 2: Use encrypted field setters
-            new_classification.set_subject_encrypted(email.get('subject', 'No Subject'))
-            new_classification.set_snippet_encrypted(email.get('snippet', ''))
-        
-        # Process Deal Flow if needed
-        if classification_result['category'] == CATEGORY_DEAL_FLOW:
-            deck_links = [l for l in classification_result['links'] if any(
-                ind in l.lower() for ind in ['docsend', 'dataroom', 'deck', 'drive.google.com', 'dropbox.com', 'notion.so']
-            )]
-            
-            # Attachment text already extracted above for classification
-            # Mark PDF attachments as deck links
-            if pdf_attachments:
-                pdf_filename = pdf_attachments[0].get('filename', 'deck.pdf')
-                if not deck_links:
-                    new_classification.deck_link = f"[PDF Attachment: {pdf_filename}]"
-                    print(f"✓ Marked PDF attachment as deck: {pdf_filename}")
-                else:
-                    # Even if there are deck links, also note PDF attachment
-                    if not new_classification.deck_link or '[PDF Attachment' not in new_classification.deck_link:
-                        new_classification.deck_link = f"{deck_links[0]} (+ {pdf_filename})"
-            
-            if deck_links:
-                new_classification.deck_link = deck_links[0]
-            
-            # Use combined_text for checking basics
-            email_body_for_basics = email.get('combined_text') or email.get('body', '')
-            basics = classifier.check_four_basics(
-                email.get('subject', ''),
-                email_body_for_basics,
-                classification_result['links'],
-                attachment_text=attachment_text
-            )
-            
-            # Calculate scores for reply generation
-            founder_email = email.get('from', '').split('<')[1].split('>')[0] if '<' in email.get('from', '') else email.get('from', '')
-            founder_name = email.get('from', '').split('<')[0].strip() if '<' in email.get('from', '') else ''
-            
-            # Scoring system removed - generate reply without scores
-            reply_body = email.get('combined_text') or email.get('body', '')
-            reply_text, reply_type, state = classifier.generate_deal_flow_reply(
-                basics, 
-                bool(deck_links) or bool(attachment_text),
-                subject=email.get('subject', ''),
-                body=reply_body,
-                sender=email.get('from', ''),
-                score=None,  # No scoring
-                team_score=None,
-                white_space_score=None
+        if not thread_ids:
+            return jsonify({'success': False, 'error': 'thread_ids required'}), 400
+        if len(thread_ids) > RECLASSIFY_BULK_MAX_THREADS:
+            return jsonify({'success': False, 'error': f'At most {RECLASSIFY_BULK_MAX_THREADS} thread_ids per request'}), 400
+        
+        gmail = get_user_gmail_client(current_user)
+        if not gmail:
+            return jsonify({'success': False, 'error': 'Failed to connect to Gmail'}), 500
+        
+        # One fetch covers every requested thread (same lookup as single reclassify, window sized to the request)
+        emails, _ = gmail.get_emails(max_results=max(10, len(thread_ids)), unread_only=False, start_history_id=None)
+        emails_by_thread = {}
+        for e in emails:
+            emails_by_thread.setdefault(e['thread_id'], e)
+        
+        deals_by_thread = {
+            deal.thread_id: deal for deal in Deal.query.filter(
+                Deal.user_id == current_user.id,
+                Deal.thread_id.in_(thread_ids)
+            ).all()
+        }
+        
+        classifier = EmailClassifier(get_openai_client())
+        results = {}
+        for thread_id in thread_ids:
+            email = emails_by_thread.get(thread_id)
+            if not email:
+                results[thread_id] = {'success': False, 'error': 'Email not found'}
+                continue
+            # Updates the fetched message's row in place; the thread's other messages and deal links stay
+            _, classification_result = reclassify_fetched_email(
+                current_user, classifier, email, thread_id,
+                existing_deal=deals_by_thread.get(thread_id)
             )
-            
-            # Clean up any closing phrases the AI might have added
-            closing_phrases = [
-                'Best regards', 'Sincerely', 'Regards', 'Thank you,', 'Thanks,',
-                '[Your Name]', '[Your Position]', '[Your Firm]', '[Your Contact Information]'
-            ]
-            for phrase in closing_phrases:
-                if phrase.lower() in reply_text.lower():
-                    idx = reply_text.lower().find(phrase.lower())
-                    reply_text = reply_text[:idx].strip()
-                    break
-            
-            # Append signature to generated reply
-            try:
-                gmail = get_user_gmail_client(current_user)
-                if gmail:
-                    selected_email = current_user.gmail_token.selected_signature_email if current_user.gmail_token else None
-                    signature = gmail.get_signature(send_as_email=selected_email)
-                    if signature:
-                        reply_text = f"{reply_text}\n\n{signature}"
-            except Exception as e:
-                print(f"Note: Could not fetch signature during reclassification: {str(e)}")
-            
-            new_classification.deal_state = state
-            new_classification.reply_type = reply_type
+            results[thread_id] = {
+                'success': True,
+                'category': classification_result['category'],
+                'confidence': classification_result['confidence'],
+                'tags': classification_result['tags']
+            }
         
-        db.session.add(new_classification)
-        db.session.commit()
-        # Mark as processed after successful commit (prevents re-processing)
-        new_classification.processed = True
         db.session.commit()
         
         return jsonify({
             'success': True,
-            'category': classification_result['category'],
-            'confidence': classification_result['confidence'],
-            'tags': classification_result['tags']
+            'results': results
         })
     
     except Exception as e:
+        db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
@@ -3307,9 +3733,7 @@ def generate_reply():
         attachment_text = None
         pdf_attachments = []
         if attachments:
-            attachment_texts = [att.get('text', '') for att in attachments if att.get('text')]
-            if attachment_texts:
-                attachment_text = '\n\n'.join(attachment_texts)
+            attachment_text = join_attachment_texts(attachments)
             pdf_attachments = [att for att in attachments if att.get('mime_type') == 'application/pdf']
         
         # Get existing classification if available
@@ -3325,17 +3749,17 @@ def generate_reply():
             headers = data.get('headers', {})
             links = classifier.extract_links(body)
             
-            # Rate limit concurrent classifications to prevent 429 errors
-            with CLASSIFICATION_SEMAPHORE:
-                classification_result = classifier.classify_email(
-                    subject=subject,
-                    body=body,  # This should already be combined_text if available
-                    headers=headers,
-                    sender=sender,
-                    links=links,
-                    thread_id=data.get('thread_id'),
-                    user_id=str(current_user.id)
-                )
+            # Identical content classified before (resent/forwarded emails) skips the model call
+            classification_result = classify_email_cached(
+                classifier,
+                subject=subject,
+                body=body,  # This should already be combined_text if available
+                headers=headers,
+                sender=sender,
+                links=links,
+                thread_id=data.get('thread_id'),
+                user_id=str(current_user.id)
+            )
             
             category = classification_result['category']
         else:
@@ -3351,10 +3775,10 @@ def generate_reply():
         
         # Generate reply based on category
         if category == CATEGORY_DEAL_FLOW:
-            links = classifier.extract_links(body) if not classification else json.loads(classification.extracted_links or '[]')
+            links = classifier.extract_links(body) if not classification else (classification.extracted_links or [])
             # Use attachment_text for checking basics (includes PDF content)
             basics = classifier.check_four_basics(subject, body, links, attachment_text=attachment_text)
-            has_deck = bool([l for l in links if any(ind in l.lower() for ind in ['docsend', 'dataroom', 'deck', 'notion.so'])]) or bool(pdf_attachments)
+            has_deck = any(DECK_LINK_RE.search(l) for l in links) or bool(pdf_attachments)
             
             # Scoring system removed - generate reply without scores
             reply_text, reply_type, state = classifier.generate_deal_flow_reply(
@@ -3374,15 +3798,7 @@ def generate_reply():
             return jsonify({'success': False, 'error': 'Could not generate reply'}), 500
         
         # Clean up any signature placeholder text the AI might have added
-        placeholder_phrases = [
-            '[Your Name]', '[Your Position]', '[Your Firm]', '[Your Contact Information]'
-        ]
-        for phrase in placeholder_phrases:
-            if phrase in reply_text:
-                # Remove the placeholder and everything after it
-                idx = reply_text.find(phrase)
-                reply_text = reply_text[:idx].strip()
-                break
+        reply_text = strip_signature_placeholders(reply_text)
         
         # Fetch and append signature to the generated reply
         try:
@@ -3567,9 +3983,8 @@ def send_reply():
         if not all([to_email, subject, body]):
             return jsonify({'success': False, 'error': 'Missing required fields'}), 400
         
-        # Extract email address
-        if '<' in to_email and '>' in to_email:
-            to_email = to_email.split('<')[1].split('>')[0]
+        # Extract email address ("Name <addr>" or a bare address)
+        to_email = parseaddr(to_email)[1] or to_email
         
         # Get selected signature email preference
         selected_email = current_user.gmail_token.selected_signature_email if current_user.gmail_token else None
@@ -3619,9 +4034,8 @@ def send_reply_with_attachments():
         if not all([to_email, subject, body]):
             return jsonify({'success': False, 'error': 'Missing required fields'}), 400
         
-        # Extract email address
-        if '<' in to_email and '>' in to_email:
-            to_email = to_email.split('<')[1].split('>')[0]
+        # Extract email address ("Name <addr>" or a bare address)
+        to_email = parseaddr(to_email)[1] or to_email
         
         # Get selected signature email preference
         selected_email = current_user.gmail_token.selected_signature_email if current_user.gmail_token else None
@@ -3671,9 +4085,8 @@ def forward_email():
         if not all([to_email, subject, original_message_id]):
             return jsonify({'success': False, 'error': 'Missing required fields'}), 400
         
-        # Extract email address
-        if '<' in to_email and '>' in to_email:
-            to_email = to_email.split('<')[1].split('>')[0]
+        # Extract email address ("Name <addr>" or a bare address)
+        to_email = parseaddr(to_email)[1] or to_email
         
         # Get selected signature email preference
         selected_email = current_user.gmail_token.selected_signature_email if current_user.gmail_token else None
@@ -3834,7 +4247,6 @@ def cancel_scheduled_email(email_id):
     """Cancel a scheduled email"""
     try:
         from models import ScheduledEmail
-        from datetime import datetime
         
         scheduled = ScheduledEmail.query.filter_by(
             id=email_id,
@@ -3878,48 +4290,25 @@ def get_signatures():
             return jsonify({'success': False, 'error': 'Failed to connect to Gmail'}), 500
         
         # Get all send-as aliases
-        aliases = gmail.service.users().settings().sendAs().list(
-            userId='me'
-        ).execute()
-        
-        send_as_list = aliases.get('sendAs', [])
+        send_as_list = gmail.list_send_as_aliases()
         signatures = []
         
+        # The UI renders the HTML signature; the plain-text preview is only sent with ?debug=1
+        include_text = request.args.get('debug') == '1'
         for alias in send_as_list:
-            signature_text = alias.get('signature', '')
-            signature_raw = signature_text  # Keep raw for debugging
-            
-            # Strip HTML for preview
-            if signature_text:
-                import re
-                # Convert HTML breaks to newlines
-                signature_text = re.sub(r'<br\s*/?>', '\n', signature_text, flags=re.IGNORECASE)
-                signature_text = re.sub(r'</p>', '\n\n', signature_text, flags=re.IGNORECASE)
-                signature_text = re.sub(r'<p[^>]*>', '', signature_text, flags=re.IGNORECASE)
-                # Remove all other HTML tags
-                signature_text = re.sub(r'<[^>]+>', '', signature_text)
-                # Clean up HTML entities
-                signature_text = signature_text.replace('&nbsp;', ' ')
-                signature_text = signature_text.replace('&amp;', '&')
-                signature_text = signature_text.replace('&lt;', '<')
-                signature_text = signature_text.replace('&gt;', '>')
-                signature_text = signature_text.replace('&quot;', '"')
-                signature_text = signature_text.replace('&#39;', "'")
-                # Clean up multiple newlines and whitespace
-                signature_text = re.sub(r'\n{3,}', '\n\n', signature_text)
-                signature_text = signature_text.strip()
-            
-            # Debug: log raw signature for troubleshooting
-            print(f"Signature for {alias.get('sendAsEmail', '')}: raw_length={len(signature_raw)}, processed_length={len(signature_text) if signature_text else 0}")
+            signature_html = alias.get('signature', '')
+            signature_text = signature_preview_text(signature_html) if signature_html else ''
             
-            signatures.append({
+            entry = {
                 'email': alias.get('sendAsEmail', ''),
                 'displayName': alias.get('displayName', ''),
                 'isPrimary': alias.get('isPrimary', False),
-                'signature': signature_text,
                 'hasSignature': bool(signature_text),
-                'signatureRaw': signature_raw  # Include raw for debugging
-            })
+                'signatureRaw': signature_html
+            }
+            if include_text:
+                entry['signature'] = signature_text
+            signatures.append(entry)
         
         # Get currently selected signature
         selected_email = current_user.gmail_token.selected_signature_email if current_user.gmail_token else None
@@ -4027,79 +4416,63 @@ def get_deals():
     try:
         deals = Deal.query.filter_by(user_id=current_user.id).order_by(Deal.created_at.desc()).all()
         
-        # Get Gmail client to fetch latest email subjects
-        gmail = get_user_gmail_client(current_user)
-        openai_client = get_openai_client()
-        classifier = EmailClassifier(openai_client)
+        # Tags come from each deal's classification; load them all in one query
+        thread_ids = list({deal.thread_id for deal in deals})
+        classifications = {}
+        if thread_ids:
+            classifications = {c.thread_id: c for c in EmailClassification.query.filter(
+                EmailClassification.user_id == current_user.id,
+                EmailClassification.thread_id.in_(thread_ids)
+            ).all()}
+        
+        def needs_attachment_check(deal):
+            return not deal.deck_link or deal.deck_link == 'No deck'
+        
+        def needs_subject(deal):
+            return not deal.subject or deal.subject == 'No Subject' or deal.subject.strip() == ''
+        
+        # Fill in missing subjects and PDF decks from Gmail, fetching all affected threads in batches
+        stale_deals = [deal for deal in deals if needs_subject(deal) or needs_attachment_check(deal)]
+        updated = False
+        if stale_deals:
+            gmail = get_user_gmail_client(current_user)
+            if gmail and gmail.service:
+                try:
+                    thread_openers = gmail.get_thread_openers(list({deal.thread_id for deal in stale_deals}))
+                except Exception as e:
+                    print(f"Note: Could not fetch email details for deals: {str(e)}")
+                    thread_openers = {}
+                
+                for deal in stale_deals:
+                    thread_email = thread_openers.get(deal.thread_id)
+                    if not thread_email:
+                        continue
+                    
+                    # Update subject if missing
+                    if needs_subject(deal) and thread_email.get('subject'):
+                        deal.subject = thread_email['subject']
+                        updated = True
+                    
+                    # Check for PDF attachments if deck_link is missing
+                    if needs_attachment_check(deal):
+                        attachments = thread_email.get('attachments', [])
+                        pdf_attachments = [att for att in attachments if att.get('mime_type') == 'application/pdf']
+                        if pdf_attachments:
+                            pdf_filename = pdf_attachments[0].get('filename', 'deck.pdf')
+                            deal.deck_link = f"[PDF Attachment: {pdf_filename}]"
+                            deal.has_deck = True
+                            updated = True
+                            print(f"✓ Updated deal {deal.thread_id} with PDF attachment: {pdf_filename}")
         
         # Scoring system removed - no re-scoring
         deals_data = []
         for deal in deals:
-            classification = EmailClassification.query.filter_by(
-                user_id=current_user.id,
-                thread_id=deal.thread_id
-            ).first()
-            
-            # Fetch latest email subject and check for attachments if needed
+            classification = classifications.get(deal.thread_id)
             subject = deal.subject or 'No Subject'
-            needs_attachment_check = not deal.deck_link or deal.deck_link == 'No deck'
             
-            if not subject or subject == 'No Subject' or subject.strip() == '' or needs_attachment_check:
-                if gmail and gmail.service:
-                    try:
-                        # Get email details for this specific thread
-                        # First try to get a message ID from the thread
-                        thread_data = gmail.service.users().threads().get(
-                            userId='me',
-                            id=deal.thread_id,
-                            format='minimal'
-                        ).execute()
-                        
-                        messages = thread_data.get('messages', [])
-                        if messages:
-                            # Get the first message in the thread
-                            message_id = messages[0]['id']
-                            thread_email = gmail.get_email_details(message_id)
-                        else:
-                            thread_email = None
-                        
-                        if thread_email:
-                            # Update subject if missing
-                            if (not subject or subject == 'No Subject' or subject.strip() == '') and thread_email.get('subject'):
-                                from email.header import decode_header
-                                import html
-                                subject = thread_email['subject']
-                                deal.subject = subject
-                            
-                            # Check for PDF attachments if deck_link is missing
-                            if needs_attachment_check:
-                                attachments = thread_email.get('attachments', [])
-                                pdf_attachments = [att for att in attachments if att.get('mime_type') == 'application/pdf']
-                                if pdf_attachments:
-                                    pdf_filename = pdf_attachments[0].get('filename', 'deck.pdf')
-                                    deal.deck_link = f"[PDF Attachment: {pdf_filename}]"
-                                    deal.has_deck = True
-                                    print(f"✓ Updated deal {deal.thread_id} with PDF attachment: {pdf_filename}")
-                            
-                            db.session.commit()
-                    except Exception as e:
-                        print(f"Note: Could not fetch email details for thread {deal.thread_id}: {str(e)}")
-            
-            # Parse portfolio overlaps
-            portfolio_overlaps = {}
-            if deal.portfolio_overlaps:
-                try:
-                    portfolio_overlaps = json.loads(deal.portfolio_overlaps)
-                except:
-                    pass
-            
-            # Parse previous companies
-            previous_companies = []
-            if deal.founder_previous_companies:
-                try:
-                    previous_companies = json.loads(deal.founder_previous_companies)
-                except:
-                    pass
+            # JSON columns come back already parsed
+            portfolio_overlaps = deal.portfolio_overlaps or {}
+            previous_companies = deal.founder_previous_companies or []
             
             # Scoring system removed - scores are always None/NA
             # No re-scoring logic needed
@@ -4117,7 +4490,7 @@ def get_deals():
                 'has_traction': deal.has_traction,
                 'has_round_info': deal.has_round_info,
                 'created_at': deal.created_at.isoformat() if deal.created_at else None,
-                'tags': classification.tags.split(',') if classification and classification.tags else [],
+                'tags': (classification.tags or []) if classification else [],
                 # Portfolio matching
                 'founder_linkedin': deal.founder_linkedin,
                 'founder_school': deal.founder_school,
@@ -4136,7 +4509,15 @@ def get_deals():
                 'traction_score': deal.traction_score,
             })
         
-        return jsonify({
+        # Commit after serializing, so the commit does not expire every deal mid-loop
+        if updated:
+            try:
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                print(f"Note: Could not save updated deal details: {str(e)}")
+        
+        return json_response({
             'success': True,
             'count': len(deals_data),
             'deals': deals_data
@@ -4148,55 +4529,47 @@ def get_deals():
 
 def _get_score_summary(deal):
     """Extract score summary from white_space_analysis or generate one"""
-    if deal.white_space_analysis:
-        try:
-            white_space_data = json.loads(deal.white_space_analysis)
-            if 'summary' in white_space_data:
-                return white_space_data['summary']
-        except:
-            pass
+    white_space_data = deal.white_space_analysis if isinstance(deal.white_space_analysis, dict) else None
+    if white_space_data and 'summary' in white_space_data:
+        return white_space_data['summary']
     
     # Generate summary from available data
-    portfolio_overlaps = {}
-    if deal.portfolio_overlaps:
-        try:
-            portfolio_overlaps = json.loads(deal.portfolio_overlaps)
-        except:
-            pass
+    portfolio_overlaps = deal.portfolio_overlaps or {}
     
     summary_parts = []
     
     # Team background
-    if isinstance(portfolio_overlaps, list) and len(portfolio_overlaps) > 0:
-        overlap_companies = [o.get('company', '') if isinstance(o, dict) else str(o) for o in portfolio_overlaps[:2]]
-        summary_parts.append(f"Team: {len(portfolio_overlaps)} portfolio match{'es' if len(portfolio_overlaps) > 1 else ''}")
+    overlap_count = len(portfolio_overlaps) if isinstance(portfolio_overlaps, list) else 0
+    if overlap_count:
+        summary_parts.append(f"Team: {overlap_count} portfolio match{'es' if overlap_count > 1 else ''}")
     else:
         summary_parts.append("Team: No portfolio matches")
     
     # White space
-    if deal.white_space_analysis:
-        try:
-            white_space_data = json.loads(deal.white_space_analysis)
-            competition = white_space_data.get('competition_intensity', 'Unknown')
-            market_size = white_space_data.get('market_size', 'Unknown')
-            reasoning = white_space_data.get('reasoning', '')
-            if reasoning:
-                summary_parts.append(f"Market: {reasoning[:80]}{'...' if len(reasoning) > 80 else ''}")
-            else:
-                summary_parts.append(f"Market: {competition} competition, {market_size} market")
-        except:
-            summary_parts.append("Market: Analysis unavailable")
+    if white_space_data:
+        competition = white_space_data.get('competition_intensity', 'Unknown')
+        market_size = white_space_data.get('market_size', 'Unknown')
+        reasoning = white_space_data.get('reasoning') or ''
+        if reasoning:
+            summary_parts.append(f"Market: {reasoning[:80]}{'...' if len(reasoning) > 80 else ''}")
+        else:
+            summary_parts.append(f"Market: {competition} competition, {market_size} market")
+    elif deal.white_space_analysis:
+        summary_parts.append("Market: Analysis unavailable")
     else:
         summary_parts.append("Market: No analysis")
     
     return " | ".join(summary_parts) if summary_parts else "No summary available"
 
 
+# Constant reply of the disabled rescore endpoint (pre-encoded, no per-call JSON encoding)
+SCORING_REMOVED_BODY = b'{"error":"Scoring system has been removed","success":false}'
+
+
 @app.route('/api/rescore-all-deals', methods=['POST'])
-@login_required
 def rescore_all_deals():
-    """Scoring system removed - this endpoint is disabled"""
-    return jsonify({'success': False, 'error': 'Scoring system has been removed'}), 400
+    """Scoring system removed - this endpoint is disabled (no login or user lookup needed to say so)"""
+    return app.response_class(SCORING_REMOVED_BODY, status=400, mimetype='application/json')
 
 
 
@@ -4215,68 +4588,32 @@ def get_attachment(message_id, filename):
         
         # Get the attachment data from Gmail
         try:
-            # Get full message to find attachment ID
-            message = gmail.service.users().messages().get(
-                userId='me',
-                id=message_id,
-                format='full'
-            ).execute()
+            # Get the message's part tree (no body data) to find the attachment ID
+            payload = get_attachment_parts(gmail, current_user.id, message_id)
             
             # Decode filename (URL encoded)
-            from urllib.parse import unquote
             decoded_filename = unquote(filename)
             
-            # Find the attachment in the message parts (any mime type)
+            # Named parts in document order: the one named like the request, else the first (fallback)
+            named_parts = named_attachment_parts(payload)
+            exact_part = next((part for part in named_parts if part['filename'] == decoded_filename), None)
+            if exact_part is None:
+                # The lookup stops four MIME levels deep; search the whole tree before falling back
+                named_parts = named_attachment_parts(get_attachment_parts(gmail, current_user.id, message_id, complete=True))
+                exact_part = next((part for part in named_parts if part['filename'] == decoded_filename), None)
+            first_named_part = named_parts[0] if named_parts else None
+            
             attachment_id = None
             attachment_mime = None
+            if exact_part is not None:
+                attachment_id = exact_part.get('body', {}).get('attachmentId')
+                attachment_mime = exact_part.get('mimeType', '')
             
-            def find_attachment_id(parts):
-                for part in parts:
-                    part_filename = part.get('filename', '')
-                    mime_type = part.get('mimeType', '')
-                    if part_filename == decoded_filename:
-                        return part.get('body', {}).get('attachmentId'), mime_type
-                    if 'parts' in part:
-                        found = find_attachment_id(part['parts'])
-                        if found:
-                            return found
-                return None
-            
-            payload = message.get('payload', {})
-            if 'parts' in payload:
-                result = find_attachment_id(payload['parts'])
-                if result:
-                    attachment_id, attachment_mime = result
-            else:
-                # Single part message
-                if payload.get('filename') == decoded_filename:
-                    attachment_id = payload.get('body', {}).get('attachmentId')
-                    attachment_mime = payload.get('mimeType', 'application/octet-stream')
-            
-            if not attachment_id:
+            if not attachment_id and first_named_part is not None:
                 # Try to find any attachment if exact filename match fails
-                def find_any_attachment(parts):
-                    for part in parts:
-                        mime_type = part.get('mimeType', '')
-                        if part.get('filename'):
-                            return (
-                                part.get('body', {}).get('attachmentId'),
-                                part.get('filename', 'attachment'),
-                                mime_type or 'application/octet-stream'
-                            )
-                        if 'parts' in part:
-                            found = find_any_attachment(part['parts'])
-                            if found:
-                                return found
-                    return None
-                
-                if 'parts' in payload:
-                    result = find_any_attachment(payload['parts'])
-                    if result:
-                        attachment_id, decoded_filename, attachment_mime = result
-                elif payload.get('filename'):
-                    attachment_id = payload.get('body', {}).get('attachmentId')
-                    attachment_mime = payload.get('mimeType', 'application/octet-stream')
+                attachment_id = first_named_part.get('body', {}).get('attachmentId')
+                decoded_filename = first_named_part['filename']
+                attachment_mime = first_named_part.get('mimeType') or 'application/octet-stream'
             
             if not attachment_id:
                 return jsonify({'success': False, 'error': 'Attachment ID not found'}), 404
@@ -4288,27 +4625,135 @@ def get_attachment(message_id, filename):
                 id=attachment_id
             ).execute()
             
-            # Decode and return the file
-            import base64
-            import io
-            from urllib.parse import quote
-            file_data = base64.urlsafe_b64decode(attachment['data'])
+            encoded = attachment['data']
+            decoded_size = len(encoded.rstrip('=')) * 3 // 4
             
-            return send_file(
-                io.BytesIO(file_data),
-                mimetype=attachment_mime or 'application/octet-stream',
-                as_attachment=False,
-                download_name=decoded_filename
-            )
+            if decoded_size <= ATTACHMENT_STREAM_MIN_SIZE:
+                # Small enough to hold: send_file answers Range requests (inline PDF viewer) and conditional GETs
+                return send_file(
+                    io.BytesIO(urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4))),
+                    mimetype=attachment_mime or 'application/octet-stream',
+                    as_attachment=False,
+                    download_name=decoded_filename
+                )
+            
+            # Decode and stream the file in chunks, so the decoded copy is never held whole
+            step = max(4, ATTACHMENT_CHUNK_SIZE // 3 * 4)  # Whole base64 quanta: every slice decodes on its own
+            
+            def generate():
+                for start in range(0, len(encoded), step):
+                    chunk = encoded[start:start + step]
+                    yield urlsafe_b64decode(chunk + '=' * (-len(chunk) % 4))
+            
+            response = Response(generate(), mimetype=attachment_mime or 'application/octet-stream')
+            # Known up front from the base64 length, so browsers still show download size and progress
+            response.content_length = decoded_size
+            try:
+                decoded_filename.encode('ascii')
+                filenames = {'filename': decoded_filename}
+            except UnicodeEncodeError:
+                filenames = {
+                    'filename': decoded_filename.encode('ascii', 'ignore').decode('ascii'),
+                    'filename*': f"UTF-8''{quote(decoded_filename)}"
+                }
+            response.headers.set('Content-Disposition', 'inline', **filenames)
+            return response
             
         except Exception as e:
-            import traceback
+            # The message may be gone or its attachment IDs stale; look it up again next time
+            forget_attachment_parts(current_user.id, message_id)
             print(f"Error downloading attachment: {str(e)}")
             traceback.print_exc()
             return jsonify({'success': False, 'error': f'Failed to download attachment: {str(e)}'}), 500
     
     except Exception as e:
-        import traceback
+        traceback.print_exc()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/attachments/<message_id>', methods=['POST'])
+@login_required
+def get_attachments_zip(message_id):
+    """Download several attachments of one message as a ZIP, fetched through Gmail batch requests"""
+    if not current_user.gmail_token:
+        return jsonify({'success': False, 'error': 'Gmail not connected'}), 400
+    
+    try:
+        data = request.json or {}
+        filenames = [att.get('filename') for att in data.get('attachments', []) if att.get('filename')]
+        if not filenames:
+            return jsonify({'success': False, 'error': 'attachments required'}), 400
+        
+        gmail = get_user_gmail_client(current_user)
+        if not gmail or not gmail.service:
+            return jsonify({'success': False, 'error': 'Failed to connect to Gmail'}), 500
+        
+        payload = get_attachment_parts(gmail, current_user.id, message_id)
+        if not set(filenames) <= {part['filename'] for part in named_attachment_parts(payload)}:
+            # Some names sit deeper than the four-level lookup; use the whole tree
+            payload = get_attachment_parts(gmail, current_user.id, message_id, complete=True)
+        attachment_ids = {}
+        for part in named_attachment_parts(payload):
+            attachment_id = part.get('body', {}).get('attachmentId')
+            if attachment_id:
+                attachment_ids.setdefault(part['filename'], []).append(attachment_id)
+        
+        # (ZIP member name, attachment ID); every part sharing a requested filename is included
+        wanted = []
+        used_names = set()
+        for filename in dict.fromkeys(filenames):
+            for attachment_id in attachment_ids.get(filename, []):
+                # Sender-controlled names: keep only the base name so nothing extracts outside the target dir
+                name = os.path.basename(filename.replace('\\', '/')).strip()
+                if not name or name in ('.', '..'):
+                    continue
+                stem, ext = os.path.splitext(name)
+                counter = 1
+                while name in used_names:
+                    name = f"{stem} ({counter}){ext}"
+                    counter += 1
+                used_names.add(name)
+                wanted.append((name, attachment_id))
+        if not wanted:
+            return jsonify({'success': False, 'error': 'Attachment ID not found'}), 404
+        
+        downloaded = {}
+        
+        def callback(request_id, response, exception):
+            if exception:
+                print(f"Error downloading attachment {wanted[int(request_id)][0]}: {str(exception)}")
+                return
+            downloaded[int(request_id)] = response['data']
+        
+        # Gmail runs the calls of one batch concurrently; small batches cap the in-flight downloads
+        for start in range(0, len(wanted), ATTACHMENT_BATCH_SIZE):
+            batch = gmail.service.new_batch_http_request(callback=callback)
+            for index in range(start, min(start + ATTACHMENT_BATCH_SIZE, len(wanted))):
+                batch.add(gmail.service.users().messages().attachments().get(
+                    userId='me',
+                    messageId=message_id,
+                    id=wanted[index][1]
+                ), request_id=str(index))
+            batch.execute()
+        
+        if not downloaded:
+            # The message may be gone or its attachment IDs stale; look it up again next time
+            forget_attachment_parts(current_user.id, message_id)
+            return jsonify({'success': False, 'error': 'Failed to download attachments'}), 500
+        
+        archive = io.BytesIO()
+        # Stored, not deflated: PDFs and images are already compressed
+        with zipfile.ZipFile(archive, 'w', zipfile.ZIP_STORED) as zip_file:
+            for index, (name, _) in enumerate(wanted):
+                encoded = downloaded.pop(index, None)
+                if encoded is not None:
+                    zip_file.writestr(name, urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4)))
+        
+        response = Response(archive.getvalue(), mimetype='application/zip')
+        response.headers.set('Content-Disposition', 'attachment', filename='attachments.zip')
+        return response
+    
+    except Exception as e:
         traceback.print_exc()
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -4328,14 +4773,13 @@ def get_thread(thread_id):
         # Don't extract attachments when viewing (much faster - no PDF downloads)
         thread_emails = gmail.get_thread_messages(thread_id, extract_attachments=False)
         
-        return jsonify({
+        return json_response({
             'success': True,
             'count': len(thread_emails),
             'emails': thread_emails
         })
     
     except Exception as e:
-        import traceback
         traceback.print_exc()
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -4417,7 +4861,7 @@ def get_threads_batch():
         
         print(f"✅ [BATCH] Successfully fetched {len(threads_data)} threads in 1 API call")
         
-        return jsonify({
+        return json_response({
             'success': True,
             'threads': threads_data,
             'fetched': len(threads_data),
@@ -4425,7 +4869,6 @@ def get_threads_batch():
         })
     
     except Exception as e:
-        import traceback
         traceback.print_exc()
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -4455,7 +4898,6 @@ def download_attachment(message_id, attachment_id):
         mime_type = request.args.get('mime_type', 'application/octet-stream')
         
         # Create response with the file
-        from flask import make_response
         response = make_response(file_data)
         response.headers['Content-Type'] = mime_type
         
@@ -4468,7 +4910,6 @@ def download_attachment(message_id, attachment_id):
         return response
     
     except Exception as e:
-        import traceback
         traceback.print_exc()
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -5025,7 +5466,6 @@ def pubsub_webhook():
             return jsonify({'status': 'no_data'}), 200
         
         # Decode base64 message data
-        import base64
         try:
             decoded_data = base64.b64decode(message_data).decode('utf-8')
             notification = json.loads(decoded_data)
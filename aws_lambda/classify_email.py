@@ -296,6 +296,140 @@ Return ONLY the JSON object. No additional text."""
     return final_result
 
 
+def classify_emails_batch_with_openai(email_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Classify several emails with a single API call
+    email_data: {"emails": [{"id", "subject", "body", "sender", "headers", "links",
+                             "deterministic_category", "has_pdf_attachment"}, ...]}
+    Returns: {"results": [{"id": ..., "label": ..., "confidence": ...}, ...]}
+    This function does NOT log email content or OpenAI requests/responses
+    """
+    emails = email_data.get('emails', [])
+    
+    input_emails = []
+    for email in emails:
+        input_emails.append({
+            "id": str(email.get('id')),
+            "subject": email.get('subject', ''),
+            "body": email.get('body', '')[:5000],  # Limit body length
+            "sender": email.get('sender', ''),
+            "headers": {k: v for k, v in list(email.get('headers', {}).items())[:10]},  # Limit headers
+            "links": email.get('links', [])[:20],  # Limit links
+            "has_pdf_attachment": email.get('has_pdf_attachment', False),
+            "deterministic_category": email.get('deterministic_category', 'general').lower()
+        })
+    
+    # Same rules as the single-email prompt, applied to each email independently
+    prompt = f"""You are a zero-hallucination email classifier for a VC partner.
+
+Classify EACH email below independently into ONE of: dealflow, hiring, networking, spam, general.
+
+Output ONLY this JSON:
+{{"results":[{{"id":"...","label":"...","confidence":0.0-1.0}}, ...]}}
+Return exactly one result per input email, using the email's "id".
+
+Rules:
+- Ignore: sigs, quotes, legal, unsub, old threads.
+- Spam overrides all. Triggers: phishing, fake invoices, crypto scams, mismatched From/Reply-To, malicious TLDs (.tk/.ml/.ga/.cf) + urgency.
+- **Legitimate domains (google.com, microsoft.com, apple.com, etc.) = ALWAYS general, never spam.**
+- Dealflow: fundraising, deck, SAFE, valuation, **warm intro about SPECIFIC startup/team**.
+- Hiring: resume, CV, job app, recruiter, JD.
+- Networking: coffee, intro, event, podcast, **no money ask AND no specific startup mentioned**.
+- General: newsletters, receipts, vendor demos, Google/Microsoft security alerts.
+- **Short body + deck/resume attachment = classify by attachment type.**
+- Each email's "deterministic_category" is a reference only; override it if the email's PRIMARY INTENT suggests otherwise.
+
+Tie-breaker: spam > dealflow > hiring > networking > general.
+
+Input emails:
+{json.dumps(input_emails, indent=2)}
+
+Return ONLY the JSON object. No additional text."""
+
+    # Get API key from Secrets Manager
+    api_key = get_openai_api_key()
+    
+    import httpx
+    client = OpenAI(
+        base_url="https://api.moonshot.ai/v1",
+        api_key=api_key,
+        timeout=httpx.Timeout(110.0, connect=10.0)  # 110s total, 10s connect (Lambda timeout is 120s)
+    )
+    
+    # Call Moonshot API with retry logic for rate limits
+    import time
+    max_retries = 3
+    retry_delay = 2  # Start with 2 seconds
+    
+    response = None
+    last_error = None
+    
+    for attempt in range(max_retries):
+        try:
+            response = client.chat.completions.create(
+                model="kimi-k2-turbo-preview",
+                messages=[
+                    {"role": "system", "content": "You are a deterministic email classifier for a venture capital firm. Return ONLY valid JSON. No markdown, no explanation, no additional text."},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.0,
+                top_p=0.0,
+                max_tokens=200 + 60 * len(input_emails),  # Short per-email result, no rationale
+                response_format={"type": "json_object"}  # JSON mode - no prose or code fences around the results
+            )
+            break
+        except Exception as api_error:
+            last_error = api_error
+            error_type = type(api_error).__name__
+            error_msg = str(api_error)
+            
+            is_rate_limit = (
+                error_type == 'RateLimitError' or 
+                '429' in error_msg or 
+                'overloaded' in error_msg.lower() or
+                'rate limit' in error_msg.lower()
+            )
+            
+            if is_rate_limit and attempt < max_retries - 1:
+                wait_time = retry_delay * (2 ** attempt)
+                logger.warning(f"Rate limit hit (attempt {attempt + 1}/{max_retries}), waiting {wait_time}s before retry...")
+                time.sleep(wait_time)
+                continue
+            else:
+                logger.error(f"API call failed: {error_type}: {error_msg[:200]}")
+                raise
+    
+    if response is None and last_error:
+        raise last_error
+    
+    if not response.choices or not response.choices[0].message.content:
+        raise ValueError("Empty message content in API response")
+    
+    ai_response = response.choices[0].message.content.strip()
+    if ai_response.startswith('```'):
+        ai_response = ai_response.split('```')[1]
+        if ai_response.startswith('json'):
+            ai_response = ai_response[4:]
+        ai_response = ai_response.strip()
+    
+    try:
+        result = json.loads(ai_response)
+    except json.JSONDecodeError as e:
+        # Log only the length - the response may echo email content
+        logger.error(f"JSON decode error in batch response. Response length: {len(ai_response)}")
+        raise ValueError(f"Failed to parse batch response as JSON: {str(e)}")
+    
+    if not isinstance(result, dict) or not isinstance(result.get('results'), list):
+        raise ValueError("Batch response missing 'results' array")
+    
+    # Clear sensitive data from memory
+    del input_emails
+    del prompt
+    del ai_response
+    
+    return result
+
+
 def generate_email_with_kimi(email_data: Dict[str, Any]) -> str:
     """
     Generate scheduled email using Kimi AI
@@ -391,7 +525,7 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """
     Lambda handler function
     - Receives encrypted email content
-    - Supports two actions: 'classify' (default) and 'generate_email'
+    - Supports three actions: 'classify' (default), 'classify_batch' and 'generate_email'
     - Decrypts email
     - Processes using OpenAI/Kimi (no logging)
     - Encrypts result
@@ -428,7 +562,42 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         email_data = json.loads(email_content)
         
         # Handle different actions
-        if action == 'generate_email':
+        if action == 'classify_batch':
+            # Classify several emails in one API call (NO logging of content - disabled above)
+            batch_result = classify_emails_batch_with_openai(email_data)
+            
+            # Encrypt result (NO logging)
+            encrypted_result = encrypt_result(json.dumps(batch_result), user_encryption_key)
+            
+            # ✅ Structured audit log: batch result (metadata only)
+            try:
+                logger.info(json.dumps({
+                    "event": "classification_batch_result",
+                    "thread_id": thread_id,
+                    "user_id": user_id,
+                    "request_id": request_id,
+                    "email_count": len(email_data.get('emails', [])),
+                    "labels": [r.get("label") for r in batch_result.get('results', [])]
+                }))
+            except Exception:
+                # Never fail the function because of logging
+                pass
+            
+            # Clear sensitive data from memory
+            del email_content
+            del email_data
+            del batch_result
+            
+            logger.info(f"Batch classification completed - Thread: {thread_id}")
+            
+            return {
+                'statusCode': 200,
+                'body': json.dumps({
+                    'success': True,
+                    'encrypted_result': encrypted_result
+                })
+            }
+        elif action == 'generate_email':
             # Generate email using Kimi AI (NO logging of content - disabled above)
             generated_email = generate_email_with_kimi(email_data)
             
@@ -51,61 +51,38 @@ def cleanup_duplicates(database_url=None):
         
         print(f"📊 Found {len(duplicates)} duplicate (user_id, message_id) pairs")
         
-        total_duplicates_to_remove = 0
-        
-        # For each duplicate pair, keep the oldest and remove the rest
-        for msg_id, user_id, count in duplicates:
-            print(f"\n🔍 Processing: message_id={msg_id}, user_id={user_id}, duplicates={count}")
-            
-            # Get all records for this (user_id, message_id) pair, ordered by classified_at
-            cur.execute('''
-                SELECT id, classified_at
+        # Rank each (user_id, message_id) group oldest-first; rank 1 is the record we keep.
+        # The whole cleanup is three set-based statements instead of four queries per pair.
+        cur.execute('''
+            CREATE TEMP TABLE duplicate_classifications ON COMMIT DROP AS
+            SELECT id, keep_id
+            FROM (
+                SELECT id,
+                       FIRST_VALUE(id) OVER w AS keep_id,
+                       ROW_NUMBER() OVER w AS rn
                 FROM email_classifications
-                WHERE message_id = %s AND user_id = %s
-                ORDER BY classified_at ASC, id ASC
-            ''', (msg_id, user_id))
-            
-            records = cur.fetchall()
-            
-            if len(records) <= 1:
-                continue
-            
-            # Keep the first (oldest) record
-            keep_id = records[0][0]
-            remove_ids = [r[0] for r in records[1:]]
-            
-            print(f"  ✓ Keeping ID {keep_id} (oldest)")
-            print(f"  🗑️  Removing IDs: {remove_ids}")
-            
-            # Check if any of the records to remove have associated deals
-            cur.execute('''
-                SELECT id FROM deals
-                WHERE classification_id = ANY(%s)
-            ''', (remove_ids,))
-            deals_to_update = cur.fetchall()
-            
-            if deals_to_update:
-                deal_ids = [d[0] for d in deals_to_update]
-                print(f"  ⚠️  Found {len(deal_ids)} deal(s) associated with records to be removed")
-                print(f"  🔄 Updating deals to point to kept record (ID {keep_id})...")
-                
-                # Update deals to point to the kept classification
-                cur.execute('''
-                    UPDATE deals
-                    SET classification_id = %s
-                    WHERE classification_id = ANY(%s)
-                ''', (keep_id, remove_ids))
-                print(f"  ✅ Updated {cur.rowcount} deal(s)")
-            
-            # Delete the duplicate email classifications
-            cur.execute('''
-                DELETE FROM email_classifications
-                WHERE id = ANY(%s)
-            ''', (remove_ids,))
-            
-            removed_count = cur.rowcount
-            total_duplicates_to_remove += removed_count
-            print(f"  ✅ Removed {removed_count} duplicate record(s)")
+                WHERE message_id IS NOT NULL
+                WINDOW w AS (PARTITION BY user_id, message_id ORDER BY classified_at ASC, id ASC)
+            ) ranked
+            WHERE rn > 1
+        ''')
+        
+        # Point deals at the kept record before their classifications are removed
+        cur.execute('''
+            UPDATE deals
+            SET classification_id = d.keep_id
+            FROM duplicate_classifications d
+            WHERE deals.classification_id = d.id
+        ''')
+        if cur.rowcount:
+            print(f"🔄 Updated {cur.rowcount} deal(s) to point to the kept records")
+        
+        # Delete the duplicate email classifications
+        cur.execute('''
+            DELETE FROM email_classifications
+            WHERE id IN (SELECT id FROM duplicate_classifications)
+        ''')
+        total_duplicates_to_remove = cur.rowcount
         
         # Commit all changes
         conn.commit()
@@ -0,0 +1,42 @@
+"""
+Shared SQLAlchemy engine for standalone migration scripts
+"""
+import atexit
+import os
+from sqlalchemy import create_engine
+from dotenv import load_dotenv
+
+load_dotenv()
+
+_engine = None
+
+
+def get_database_url():
+    """Get DATABASE_URL from the environment, normalised for psycopg2"""
+    database_url = os.getenv('DATABASE_URL')
+
+    if not database_url:
+        raise ValueError("DATABASE_URL environment variable not set.")
+
+    # Convert postgres:// to postgresql:// for SQLAlchemy
+    if database_url.startswith('postgres://'):
+        database_url = database_url.replace('postgres://', 'postgresql://', 1)
+
+    return database_url
+
+
+def get_engine():
+    """Return the process-wide pooled engine, creating it on first use"""
+    global _engine
+    if _engine is None:
+        _engine = create_engine(
+            get_database_url(),
+            pool_size=10,
+            max_overflow=5,
+            pool_timeout=30,
+            pool_pre_ping=True,  # Verify connections before using
+            future=True,
+        )
+        # Release pooled connections once, when the process exits
+        atexit.register(_engine.dispose)
+    return _engine
@@ -47,6 +47,35 @@ TAG_HIRING = "HR/Hiring"
 TAG_SPAM = "SPAM/Skip"
 TAG_GENERAL = "GEN/General"
 
+# Link hosts and keywords that mark a link as a pitch deck
+DECK_LINK_RE = re.compile(r'docsend|dataroom|deck|drive\.google\.com|dropbox\.com|notion\.so', re.IGNORECASE)
+
+# Keyword checks behind check_four_basics (one case-insensitive scan each instead of a lower() copy + per-keyword scans)
+def _keyword_re(keywords):
+    return re.compile('|'.join(re.escape(keyword) for keyword in keywords), re.IGNORECASE)
+
+DECK_KEYWORDS_RE = _keyword_re([
+    'pitch', 'deck', 'presentation', 'fundraising', 'investment', 'valuation',
+    'market opportunity', 'traction', 'revenue', 'mrr', 'arr', 'customers',
+    'users', 'team', 'founder', 'co-founder', 'round', 'seed', 'series'
+])
+TEAM_KEYWORDS_RE = _keyword_re(['founder', 'co-founder', 'team', 'ceo', 'cto', 'founders'])
+TRACTION_KEYWORDS_RE = _keyword_re([
+    'mrr', 'arr', 'users', 'customers', 'revenue', 'pilots', 'month', 'traction', 'growth'
+])
+ROUND_KEYWORDS_RE = _keyword_re([
+    'seed', 'series', 'round', 'raising', 'amount', 'committed', 'lead',
+    'investor', 'funding', 'capital', '$', 'k', 'million'
+])
+
+# Tags attached to a final classification (GENERAL emails stay untagged)
+CATEGORY_TAGS = {
+    CATEGORY_DEAL_FLOW: (TAG_DEAL,),
+    CATEGORY_NETWORKING: (TAG_NETWORKING,),
+    CATEGORY_HIRING: (TAG_HIRING,),
+    CATEGORY_SPAM: (TAG_SPAM,),
+}
+
 
 class EmailClassifier:
     """Classify emails into VC categories using deterministic rules + AWS Lambda (REQUIRED)"""
@@ -347,6 +376,17 @@ class EmailClassifier:
         # Return True only if it has networking indicators AND is NOT a warm intro
         return has_networking_pattern and not has_warm_intro_pattern
     
+    @staticmethod
+    def deterministic_header_key(headers: Dict[str, str]) -> Tuple:
+        """
+        The parts of the headers deterministic_classify reads (keep in step with
+        check_security_threat and check_newsletter_sender)
+        """
+        return (
+            headers.get('X-Spam-Score', ''),
+            'List-Unsubscribe' in headers or 'List-Id' in headers
+        )
+    
     def deterministic_classify(
         self, 
         subject: str, 
@@ -443,11 +483,12 @@ class EmailClassifier:
         has_pdf_attachment: bool = False,
         thread_id: str = None,
         user_id: str = None
-    ) -> Tuple[str, float]:
+    ) -> Tuple[str, float, bool]:
         """
         Use AWS Lambda to validate/override deterministic classification.
         Lambda is REQUIRED - no fallbacks.
-        Returns: (category, confidence)
+        Returns: (category, confidence, labeled) - labeled is False when Lambda fell back
+        to the deterministic category
         
         Raises:
             ValueError: If Lambda client is not available
@@ -494,7 +535,8 @@ class EmailClassifier:
             'category': str,
             'confidence': float,
             'tags': List[str],
-            'links': List[str]
+            'links': List[str],
+            'model_labeled': bool  # False if the model call failed and the rule-based category was kept
         }
         """
         if links is None:
@@ -506,29 +548,71 @@ class EmailClassifier:
         )
         
         # Step 2: OpenAI validation/override (via Lambda if available)
-        final_category, confidence = self.openai_classify(
+        final_category, confidence, model_labeled = self.openai_classify(
             subject, body, headers, sender, links, det_category, has_pdf_attachment,
             thread_id=thread_id, user_id=user_id
         )
         
         # Step 3: Determine tags
-        tags = []
-        if final_category == CATEGORY_DEAL_FLOW:
-            tags.append(TAG_DEAL)
-        elif final_category == CATEGORY_NETWORKING:
-            tags.append(TAG_NETWORKING)
-        elif final_category == CATEGORY_HIRING:
-            tags.append(TAG_HIRING)
-        elif final_category == CATEGORY_SPAM:
-            tags.append(TAG_SPAM)
+        tags = list(CATEGORY_TAGS.get(final_category, ()))
         
         return {
             'category': final_category,
             'confidence': confidence,
             'tags': tags,
-            'links': links
+            'links': links,
+            'model_labeled': model_labeled
         }
     
+    def classify_batch(self, emails: List[Dict], user_id: str = None) -> List[Dict]:
+        """
+        Classify several emails with a single model call
+        Each email dict takes the same fields as classify_email's arguments:
+        subject, body, headers, sender, links, has_pdf_attachment, thread_id
+        Returns: one classify_email-style result dict per email, in order
+        """
+        if not emails:
+            return []
+        
+        if not self.lambda_client:
+            raise ValueError(
+                "AWS Lambda client is required but not available. "
+                "Please ensure LAMBDA_FUNCTION_ARN and AWS credentials are configured."
+            )
+        
+        # Step 1: Deterministic classification per email
+        requests = []
+        for email in emails:
+            links = email.get('links')
+            if links is None:
+                links = self.extract_links(email.get('body', ''))
+            det_category, _ = self.deterministic_classify(
+                email.get('subject', ''), email.get('body', ''), email.get('headers', {}),
+                email.get('sender', ''), links, email.get('has_pdf_attachment', False)
+            )
+            requests.append({**email, 'links': links, 'deterministic_category': det_category})
+        
+        # Step 2: One Lambda call validates/overrides the whole batch
+        try:
+            outcomes = self.lambda_client.classify_emails_batch(requests, user_id=user_id)
+        except Exception as e:
+            raise Exception(f"Lambda batch classification failed: {str(e)}")
+        
+        # Step 3: Determine tags
+        results = []
+        for request, (final_category, confidence, model_labeled) in zip(requests, outcomes):
+            tags = list(CATEGORY_TAGS.get(final_category, ()))
+            
+            results.append({
+                'category': final_category,
+                'confidence': confidence,
+                'tags': tags,
+                'links': request['links'],
+                'model_labeled': model_labeled
+            })
+        
+        return results
+    
     def check_four_basics(self, subject: str, body: str, links: List[str], attachment_text: Optional[str] = None) -> Dict[str, bool]:
         """
         Check if Deal Flow email has the four basics:
@@ -545,34 +629,16 @@ class EmailClassifier:
         if attachment_text:
             combined_body = f"{body}\n\n{attachment_text}"
         
-        text = f"{subject} {combined_body}".lower()
-        links_text = ' '.join(links).lower()
-        
-        has_deck = any(indicator in links_text for indicator in [
-            'docsend', 'dataroom', 'deck', 'drive.google.com', 'dropbox.com', 'notion.so'
-        ])
+        text = f"{subject} {combined_body}"
+        has_deck = any(DECK_LINK_RE.search(link) for link in links)
         # Also check if attachment text contains deck-related keywords
         if attachment_text and not has_deck:
-            att_text_lower = attachment_text.lower()
-            deck_keywords = ['pitch', 'deck', 'presentation', 'fundraising', 'investment', 'valuation', 
-                           'market opportunity', 'traction', 'revenue', 'mrr', 'arr', 'customers', 
-                           'users', 'team', 'founder', 'co-founder', 'round', 'seed', 'series']
-            if any(keyword in att_text_lower for keyword in deck_keywords):
+            if DECK_KEYWORDS_RE.search(attachment_text):
                 has_deck = True
         
-        has_team_info = any(keyword in text for keyword in [
-            'founder', 'co-founder', 'team', 'ceo', 'cto', 'founders'
-        ])
-        
-        has_traction = any(keyword in text for keyword in [
-            'mrr', 'arr', 'users', 'customers', 'revenue', 'pilots', 'month',
-            'traction', 'growth', 'customers'
-        ])
-        
-        has_round_info = any(keyword in text for keyword in [
-            'seed', 'series', 'round', 'raising', 'amount', 'committed', 'lead',
-            'investor', 'funding', 'capital', '$', 'k', 'million'
-        ])
+        has_team_info = bool(TEAM_KEYWORDS_RE.search(text))
+        has_traction = bool(TRACTION_KEYWORDS_RE.search(text))
+        has_round_info = bool(ROUND_KEYWORDS_RE.search(text))
         
         return {
             'has_deck': has_deck or bool(links),
@@ -581,6 +647,15 @@ class EmailClassifier:
             'has_round_info': has_round_info
         }
     
+    @staticmethod
+    def deal_flow_reply_state(basics: Dict[str, bool], has_deck_link: bool) -> Tuple[str, str]:
+        """
+        The (reply_type, state) generate_deal_flow_reply would return, without generating the reply text
+        """
+        if all(basics.values()) or has_deck_link:
+            return "ack", STATE_ROUTED
+        return "ask-more", STATE_ASK_MORE
+    
     def generate_deal_flow_reply(
         self,
         basics: Dict[str, bool],
@@ -6,12 +6,15 @@ import json
 import base64
 import re
 import io
+import time
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.base import MIMEBase
 from email import encoders
 from email.header import decode_header
 import html
+import requests
+from requests.adapters import HTTPAdapter
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
@@ -35,6 +38,26 @@ except ImportError:
 
 # Moonshot removed - using PyPDF2 only for PDF extraction
 
+# SIMD base64 decoder for attachment payloads (same API as the stdlib function it replaces)
+try:
+    from pybase64 import urlsafe_b64decode
+except ImportError:
+    from base64 import urlsafe_b64decode
+
+
+# Shared keep-alive pool for OAuth token refreshes (avoids a TLS handshake per refresh)
+_auth_session = requests.Session()
+_auth_session.mount('https://', HTTPAdapter(pool_connections=20, pool_maxsize=20))
+
+
+def build_gmail_service(creds):
+    """Build the Gmail API service from the bundled discovery document (no discovery fetch)"""
+    return build('gmail', 'v1', credentials=creds, static_discovery=True, cache_discovery=False)
+
+
+# Send-as aliases (and their signatures) rarely change; clients reuse a fetched list this long
+SEND_AS_CACHE_TTL = 300  # seconds
+
 
 # Gmail API scopes
 # Note: Google automatically adds 'openid' scope when requesting userinfo scopes
@@ -58,6 +81,7 @@ class GmailClient:
                        If None, will try to authenticate via OAuth flow
         """
         self.service = None
+        self._send_as_cache = None  # (time.monotonic() fetched, sendAs list)
         if token_json:
             self.authenticate_from_token(token_json)
         else:
@@ -94,7 +118,7 @@ class GmailClient:
             if creds.expired:
                 if creds.refresh_token:
                     try:
-                        creds.refresh(Request())
+                        creds.refresh(Request(session=_auth_session))
                         # After successful refresh, update the stored token if possible
                         # (This helps keep tokens fresh, but we can't update DB here without user context)
                     except Exception as refresh_error:
@@ -118,7 +142,7 @@ class GmailClient:
                     print(f"   Make sure to use prompt='consent' to get a refresh_token.")
                     return False
             
-            self.service = build('gmail', 'v1', credentials=creds)
+            self.service = build_gmail_service(creds)
             return True
         except Exception as e:
             error_msg = str(e)
@@ -143,7 +167,7 @@ class GmailClient:
         flow = InstalledAppFlow.from_client_secrets_file('credentials.json', SCOPES)
         creds = flow.run_local_server(port=0)
         
-        self.service = build('gmail', 'v1', credentials=creds)
+        self.service = build_gmail_service(creds)
         return creds.to_json()  # Return token JSON for storage
     
     def get_unread_emails(self, max_results=10, start_history_id=None):
@@ -492,7 +516,7 @@ class GmailClient:
             print(f"❌ Error deleting draft: {str(e)}")
             return False
     
-    def get_emails(self, max_results=10, unread_only=False, start_history_id=None, custom_query=None):
+    def get_emails(self, max_results=10, unread_only=False, start_history_id=None, custom_query=None, extract_attachments=True):
         """
         Get emails from inbox using batch requests (optimized to reduce API calls).
         Supports incremental sync via Gmail History API.
@@ -502,6 +526,8 @@ class GmailClient:
             unread_only: Only fetch unread emails
             start_history_id: If provided, use incremental sync (fetch ALL changes since this ID, ignores max_results)
             custom_query: Optional custom Gmail search query (overrides default query)
+            extract_attachments: If False, only list attachments; call extract_attachment_text()
+                                 later for the emails that need their content
         
         Returns:
             tuple: (emails_list, new_history_id)
@@ -514,7 +540,7 @@ class GmailClient:
             # This fetches ALL new emails since history_id (ignores max_results limit)
             if start_history_id:
                 print(f"🔄 Using incremental sync from history ID: {start_history_id} (fetching ALL new emails, no limit)")
-                result = self._get_emails_incremental(start_history_id, unread_only)
+                result = self._get_emails_incremental(start_history_id, unread_only, extract_attachments=extract_attachments)
                 # Return in old format for backward compatibility (emails, history_id)
                 # Note: deleted_ids are available in result but not returned here
                 # They should be accessed separately via the full result dict
@@ -598,7 +624,7 @@ class GmailClient:
                         latest_history_id = response['historyId']
                     
                     # Extract attachments for classification
-                    email_data = self._extract_message_data(response, extract_attachments=True)
+                    email_data = self._extract_message_data(response, extract_attachments=extract_attachments)
                     if email_data:
                         emails.append(email_data)
             
@@ -826,7 +852,7 @@ class GmailClient:
                 print(f"Error fetching older emails: {error_str}")
                 return emails, page_token, len(emails)
     
-    def _get_emails_incremental(self, start_history_id, unread_only=False):
+    def _get_emails_incremental(self, start_history_id, unread_only=False, extract_attachments=True):
         """
         Fetch only changes since start_history_id using Gmail History API.
         This is MUCH faster and uses far fewer API calls than full sync.
@@ -967,7 +993,7 @@ class GmailClient:
                     errors.append(exception)
                 else:
                     # Extract attachments for classification
-                    email_data = self._extract_message_data(response, extract_attachments=True)
+                    email_data = self._extract_message_data(response, extract_attachments=extract_attachments)
                     if email_data:
                         emails.append(email_data)
             
@@ -1050,7 +1076,7 @@ class GmailClient:
                             query = f'is:unread in:inbox after:{seven_days_ago}'
                         
                         print(f"🔄 Fetching recent emails (last 7 days) to catch up after history_id expiration...")
-                        emails, history_id = self.get_emails(max_results=200, unread_only=unread_only, start_history_id=None, custom_query=query)
+                        emails, history_id = self.get_emails(max_results=200, unread_only=unread_only, start_history_id=None, custom_query=query, extract_attachments=extract_attachments)
                         
                         # Use the current history_id from profile (more reliable than from messages.list)
                         if current_history_id:
@@ -1066,7 +1092,7 @@ class GmailClient:
                     else:
                         # Fallback if we can't get current history_id
                         print(f"⚠️  Could not get current history_id, falling back to limited full sync")
-                        emails, history_id = self.get_emails(max_results=100, unread_only=unread_only, start_history_id=None)
+                        emails, history_id = self.get_emails(max_results=100, unread_only=unread_only, start_history_id=None, extract_attachments=extract_attachments)
                         return {
                             'new_emails': emails,
                             'deleted_ids': [],
@@ -1076,7 +1102,7 @@ class GmailClient:
                 except Exception as fallback_error:
                     print(f"⚠️  Error in history_id recovery: {str(fallback_error)[:200]}")
                     # Last resort: limited full sync
-                    emails, history_id = self.get_emails(max_results=100, unread_only=unread_only, start_history_id=None)
+                    emails, history_id = self.get_emails(max_results=100, unread_only=unread_only, start_history_id=None, extract_attachments=extract_attachments)
                     return {
                         'new_emails': emails,
                         'deleted_ids': [],
@@ -1138,6 +1164,57 @@ class GmailClient:
             print(f"Error fetching thread messages: {str(e)}")
             return []
     
+    def get_thread_openers(self, thread_ids):
+        """
+        Get the first message of each thread (attachments listed, not downloaded).
+        Threads are fetched through Gmail batch requests (10 threads per HTTP call).
+        Returns {thread_id: email_data}; deleted or failing threads are left out.
+        """
+        if not self.service or not thread_ids:
+            return {}
+        
+        openers = {}
+        
+        def callback(request_id, response, exception):
+            if exception:
+                error_str = str(exception)
+                # Deleted threads are normal here, don't spam logs
+                if '404' not in error_str and 'notFound' not in error_str:
+                    print(f"Note: Could not fetch thread {request_id}: {error_str}")
+                return
+            thread_emails = [
+                email_data for email_data in
+                (self._extract_message_data(message) for message in response.get('messages', []))
+                if email_data
+            ]
+            if not thread_emails:
+                return
+            opener = thread_emails[0]
+            # Replies can drop the subject; borrow the first one in the thread
+            if not opener.get('subject') or opener.get('subject') == 'No Subject':
+                opener['subject'] = next(
+                    (e['subject'] for e in thread_emails if e.get('subject') and e['subject'] != 'No Subject'),
+                    opener.get('subject')
+                )
+            openers[request_id] = opener
+        
+        # Threads carry full message payloads, so keep batches small (same size as message batches)
+        BATCH_SIZE = 10
+        for start in range(0, len(thread_ids), BATCH_SIZE):
+            batch = self.service.new_batch_http_request(callback=callback)
+            for thread_id in thread_ids[start:start + BATCH_SIZE]:
+                batch.add(self.service.users().threads().get(
+                    userId='me',
+                    id=thread_id,
+                    format='full'
+                ), request_id=thread_id)
+            try:
+                batch.execute()
+            except Exception as batch_error:
+                print(f"⚠️  Thread batch error: {batch_error}")
+        
+        return openers
+    
     def _extract_message_data(self, message, extract_attachments=False):
         """
         Extract email data from a message object (no API call).
@@ -1198,34 +1275,9 @@ class GmailClient:
             else:
                 # Just list attachment metadata for on-demand download (much faster!)
                 attachments_data = self._list_attachments_only(message['payload'], message_id)
-            attachment_texts = []
-            pdf_attachments = []
-            
-            # Limit total attachment text to 1500 characters
-            total_attachment_chars = 0
-            MAX_ATTACHMENT_CHARS = 1500
-            
-            for att in attachments_data:
-                if att.get('text'):
-                    att_text = att['text']
-                    # Calculate remaining characters available
-                    remaining_chars = MAX_ATTACHMENT_CHARS - total_attachment_chars
-                    if remaining_chars > 0:
-                        # Truncate if needed
-                        if len(att_text) > remaining_chars:
-                            att_text = att_text[:remaining_chars] + "... [truncated]"
-                        attachment_texts.append(att_text)
-                        total_attachment_chars += len(att_text)
-                    else:
-                        # No more space for attachments
-                        break
-                if att.get('mime_type') == 'application/pdf':
-                    pdf_attachments.append(att)
             
             # Combine body with attachment text (for classification)
-            combined_text = body
-            if attachment_texts:
-                combined_text = f"{body}\n\n--- Attachment Content ---\n\n" + "\n\n".join(attachment_texts)
+            combined_text = self._combine_attachment_text(body, attachments_data)
             
             # Decode HTML entities in body and snippet (classification uses plain text)
             if body:
@@ -1269,6 +1321,86 @@ class GmailClient:
             print(f"Error extracting message data: {str(e)}")
             return None
     
+    def _combine_attachment_text(self, body, attachments_data):
+        """Append extracted attachment text to the body (capped at 1500 characters)"""
+        attachment_texts = []
+        
+        # Limit total attachment text to 1500 characters
+        total_attachment_chars = 0
+        MAX_ATTACHMENT_CHARS = 1500
+        
+        for att in attachments_data:
+            if att.get('text'):
+                att_text = att['text']
+                # Calculate remaining characters available
+                remaining_chars = MAX_ATTACHMENT_CHARS - total_attachment_chars
+                if remaining_chars > 0:
+                    # Truncate if needed
+                    if len(att_text) > remaining_chars:
+                        att_text = att_text[:remaining_chars] + "... [truncated]"
+                    attachment_texts.append(att_text)
+                    total_attachment_chars += len(att_text)
+                else:
+                    # No more space for attachments
+                    break
+        
+        if not attachment_texts:
+            return body
+        return f"{body}\n\n--- Attachment Content ---\n\n" + "\n\n".join(attachment_texts)
+    
+    def extract_attachment_texts(self, emails):
+        """
+        Download and parse the attachments of emails fetched with extract_attachments=False.
+        Downloads go through Gmail batch requests (10 attachments per HTTP call).
+        Updates each email's 'attachments' and 'combined_text' in place.
+        """
+        # (email, attachment index, listed attachment) for everything still to download
+        jobs = []
+        for email in emails:
+            for idx, att in enumerate(email.get('attachments') or []):
+                if att.get('attachment_id'):
+                    jobs.append((email, idx, att))
+        if not jobs:
+            return emails
+        
+        downloaded = {}
+        
+        def callback(request_id, response, exception):
+            if exception:
+                print(f"Note: Could not download attachment: {str(exception)}")
+            elif response:
+                downloaded[request_id] = response.get('data')
+        
+        # Attachment payloads are large, so keep batches small (same size as message batches)
+        BATCH_SIZE = 10
+        for start in range(0, len(jobs), BATCH_SIZE):
+            batch = self.service.new_batch_http_request(callback=callback)
+            for job_idx in range(start, min(start + BATCH_SIZE, len(jobs))):
+                email, _, att = jobs[job_idx]
+                batch.add(self.service.users().messages().attachments().get(
+                    userId='me',
+                    messageId=att.get('message_id') or email['id'],
+                    id=att['attachment_id']
+                ), request_id=str(job_idx))
+            try:
+                batch.execute()
+            except Exception as batch_error:
+                print(f"⚠️  Attachment batch error: {batch_error}")
+        
+        touched = []
+        for job_idx, (email, idx, att) in enumerate(jobs):
+            attachments = email['attachments']
+            attachments[idx] = self._parse_attachment_data(
+                downloaded.get(str(job_idx)), att['filename'], att['mime_type']
+            )
+            if not touched or touched[-1] is not email:
+                touched.append(email)
+        
+        for email in touched:
+            combined_text = self._combine_attachment_text(email.get('body', ''), email['attachments'])
+            email['combined_text'] = html.unescape(combined_text) if combined_text else combined_text
+        return emails
+    
     def get_email_details(self, message_id):
         """Get details of a specific email (makes 1 API call)"""
         if not self.service:
@@ -1457,47 +1589,7 @@ class GmailClient:
                         walk_parts(part['parts'])
                     continue
                 
-                # Download attachment
-                try:
-                    attachment = self.service.users().messages().attachments().get(
-                        userId='me',
-                        messageId=message_id,
-                        id=attachment_id
-                    ).execute()
-                    
-                    # Decode attachment data
-                    file_data = base64.urlsafe_b64decode(attachment['data'])
-                    
-                    # Extract text based on file type
-                    extracted_text = None
-                    
-                    if mime_type == 'application/pdf':
-                        extracted_text = self._extract_pdf_text(file_data, filename)
-                    elif mime_type in ['application/vnd.openxmlformats-officedocument.wordprocessingml.document', 
-                                       'application/msword']:
-                        extracted_text = self._extract_docx_text(file_data, filename)
-                    elif mime_type.startswith('text/'):
-                        try:
-                            extracted_text = file_data.decode('utf-8')
-                        except:
-                            extracted_text = file_data.decode('latin-1', errors='ignore')
-                    
-                    attachments.append({
-                        'filename': filename,
-                        'mime_type': mime_type,
-                        'size': len(file_data),
-                        'text': extracted_text,
-                        'has_text': bool(extracted_text)
-                    })
-                except Exception as e:
-                    print(f"Note: Could not extract attachment {filename}: {str(e)}")
-                    attachments.append({
-                        'filename': filename,
-                        'mime_type': mime_type,
-                        'size': 0,
-                        'text': None,
-                        'has_text': False
-                    })
+                attachments.append(self._download_attachment_text(message_id, attachment_id, filename, mime_type))
         
         # Start walking from payload
         if 'parts' in payload:
@@ -1505,6 +1597,69 @@ class GmailClient:
         
         return attachments
     
+    def _download_attachment_text(self, message_id, attachment_id, filename, mime_type):
+        """Download one attachment and parse its text content"""
+        try:
+            attachment = self.service.users().messages().attachments().get(
+                userId='me',
+                messageId=message_id,
+                id=attachment_id
+            ).execute()
+            data = attachment['data']
+        except Exception as e:
+            print(f"Note: Could not extract attachment {filename}: {str(e)}")
+            data = None
+        return self._parse_attachment_data(data, filename, mime_type)
+    
+    def _parse_attachment_data(self, data, filename, mime_type):
+        """Parse text out of base64url attachment data (None = download failed)"""
+        failed = {
+            'filename': filename,
+            'mime_type': mime_type,
+            'size': 0,
+            'text': None,
+            'has_text': False
+        }
+        if data is None:
+            return failed
+        
+        try:
+            # Decode attachment data
+            file_data = urlsafe_b64decode(data)
+            
+            # Extract text based on file type
+            extracted_text = None
+            
+            if mime_type == 'application/pdf':
+                extracted_text = self._extract_pdf_text(file_data, filename)
+            elif mime_type in ['application/vnd.openxmlformats-officedocument.wordprocessingml.document', 
+                               'application/msword']:
+                extracted_text = self._extract_docx_text(file_data, filename)
+            elif mime_type.startswith('text/'):
+                # Decode only the head; 1500 characters never need more than 4 bytes each
+                head = file_data[:6000]
+                try:
+                    extracted_text = head.decode('utf-8')
+                except UnicodeDecodeError as e:
+                    if len(file_data) > len(head) and e.start >= len(head) - 3:
+                        # The cut split a multi-byte character; keep what precedes it
+                        extracted_text = head[:e.start].decode('utf-8')
+                    else:
+                        extracted_text = head.decode('latin-1', errors='ignore')
+                if len(extracted_text) > 1500 or len(file_data) > len(head):
+                    extracted_text = extracted_text[:1500] + '...'
+            
+            return {
+                'filename': filename,
+                'mime_type': mime_type,
+                'size': len(file_data),
+                'text': extracted_text,
+                'has_text': bool(extracted_text)
+            }
+        except Exception as e:
+            print(f"Note: Could not extract attachment {filename}: {str(e)}")
+            return failed
+    
     def _extract_pdf_text(self, file_data, filename):
         """Extract text from PDF using PyPDF2 only"""
         if not PDF_AVAILABLE:
@@ -1546,15 +1701,20 @@ class GmailClient:
                         return None
             
             text_parts = []
+            total_chars = 0
             
             # Extract text from each page with individual error handling
             for page_num, page in enumerate(pdf_reader.pages):
+                # Only the first 1500 characters are kept, so stop parsing pages once we have them
+                if total_chars > 1500:
+                    break
                 try:
                     # Suppress stderr during page extraction
                     with suppress_stderr():
                         page_text = page.extract_text()
                     if page_text:
                         text_parts.append(page_text)
+                        total_chars += len(page_text)
                 except Exception as page_error:
                     # Skip problematic pages (FloatObject errors, etc.)
                     error_str = str(page_error)
@@ -1588,12 +1748,19 @@ class GmailClient:
             doc = Document(doc_file)
             text_parts = []
             
+            total_chars = 0
+            
             for paragraph in doc.paragraphs:
+                # Only the first 1500 characters are kept, same as PDFs
+                if total_chars > 1500:
+                    break
                 if paragraph.text.strip():
                     text_parts.append(paragraph.text)
+                    total_chars += len(paragraph.text)
             
             if text_parts:
-                return '\n\n'.join(text_parts)
+                full_text = '\n\n'.join(text_parts)
+                return full_text[:1500] + ('...' if len(full_text) > 1500 else '')
         except Exception as e:
             print(f"Note: Could not parse Word document {filename}: {str(e)}")
         
@@ -1814,7 +1981,7 @@ class GmailClient:
                             id=att['attachmentId']
                         ).execute()
                         
-                        file_data = base64.urlsafe_b64decode(att_data['data'])
+                        file_data = urlsafe_b64decode(att_data['data'])
                         part = MIMEBase('application', 'octet-stream')
                         part.set_payload(file_data)
                         encoders.encode_base64(part)
@@ -1941,6 +2108,18 @@ class GmailClient:
             traceback.print_exc()
             return False
     
+    def list_send_as_aliases(self):
+        """Get the account's send-as aliases (cached for SEND_AS_CACHE_TTL seconds)"""
+        if self._send_as_cache and time.monotonic() - self._send_as_cache[0] < SEND_AS_CACHE_TTL:
+            return self._send_as_cache[1]
+        
+        aliases = self.service.users().settings().sendAs().list(
+            userId='me'
+        ).execute()
+        send_as_list = aliases.get('sendAs', [])
+        self._send_as_cache = (time.monotonic(), send_as_list)
+        return send_as_list
+    
     def get_signature(self, send_as_email=None, html=False):
         """
         Get the user's email signature from a specific or primary send-as alias
@@ -1958,11 +2137,7 @@ class GmailClient:
         
         try:
             # Get all send-as aliases
-            aliases = self.service.users().settings().sendAs().list(
-                userId='me'
-            ).execute()
-            
-            send_as_list = aliases.get('sendAs', [])
+            send_as_list = self.list_send_as_aliases()
             selected_alias = None
             
             # Find the requested alias by email
@@ -2130,7 +2305,7 @@ class GmailClient:
             ).execute()
             
             # Decode attachment data
-            file_data = base64.urlsafe_b64decode(attachment['data'])
+            file_data = urlsafe_b64decode(attachment['data'])
             return file_data
         except Exception as e:
             print(f"Error downloading attachment: {str(e)}")
@@ -19,6 +19,17 @@ from cryptography.fernet import Fernet
 import base64
 
 
+# Map Lambda labels to category constants
+LABEL_TO_CATEGORY = {
+    'dealflow': 'DEAL_FLOW',
+    'deal flow': 'DEAL_FLOW',
+    'hiring': 'HIRING',
+    'networking': 'NETWORKING',
+    'spam': 'SPAM',
+    'general': 'GENERAL'
+}
+
+
 class LambdaClient:
     """Client for calling AWS Lambda email classification function"""
     
@@ -94,10 +105,11 @@ class LambdaClient:
         has_pdf_attachment: bool = False,
         thread_id: str = None,
         user_id: str = None
-    ) -> Tuple[str, float]:
+    ) -> Tuple[str, float, bool]:
         """
         Classify email using AWS Lambda
-        Returns: (category, confidence)
+        Returns: (category, confidence, labeled) - labeled is False when the Lambda call
+        failed and the deterministic category came back as a fallback
         """
         try:
             # Prepare email data
@@ -159,23 +171,102 @@ class LambdaClient:
             confidence = float(result_data.get('confidence', 0.75))
             
             # Map label to category constant
-            category_map = {
-                'dealflow': 'DEAL_FLOW',
-                'deal flow': 'DEAL_FLOW',
-                'hiring': 'HIRING',
-                'networking': 'NETWORKING',
-                'spam': 'SPAM',
-                'general': 'GENERAL'
+            category = LABEL_TO_CATEGORY.get(label, 'GENERAL')
+            
+            return (category, confidence, True)
+            
+        except Exception as e:
+            print(f"Error calling Lambda: {str(e)}")
+            # Fallback to deterministic classification
+            return (deterministic_category, 0.5, False)
+    
+    def classify_emails_batch(
+        self,
+        emails: List[Dict],
+        user_id: str = None
+    ) -> List[Tuple[str, float, bool]]:
+        """
+        Classify several emails with one Lambda invocation (one model call)
+        Each email dict needs: subject, body, sender, headers, links,
+        deterministic_category, has_pdf_attachment (and optionally thread_id)
+        Returns: [(category, confidence, labeled), ...] in the same order as emails;
+        labeled is False for emails that kept their deterministic fallback
+        """
+        fallback = [(email['deterministic_category'], 0.5, False) for email in emails]
+        if not emails:
+            return []
+        
+        try:
+            # Use list positions as ids so results can be matched back
+            email_data = {
+                'emails': [
+                    {
+                        'id': str(idx),
+                        'subject': email.get('subject', ''),
+                        'body': email.get('body', ''),
+                        'sender': email.get('sender', ''),
+                        'headers': email.get('headers', {}),
+                        'links': email.get('links', []),
+                        'deterministic_category': email['deterministic_category'],
+                        'has_pdf_attachment': email.get('has_pdf_attachment', False)
+                    }
+                    for idx, email in enumerate(emails)
+                ]
+            }
+            
+            encrypted_email, one_time_key = self._encrypt_email_data(email_data)
+            user_key = os.getenv('ENCRYPTION_KEY')
+            
+            payload = {
+                'encrypted_email': encrypted_email,
+                'encryption_key': one_time_key,  # One-time key for decryption
+                'user_encryption_key': user_key,  # User's key for result encryption
+                'thread_id': emails[0].get('thread_id') or 'batch',
+                'user_id': user_id or 'unknown',
+                'action': 'classify_batch'
             }
             
-            category = category_map.get(label, 'GENERAL')
+            response = self.lambda_client.invoke(
+                FunctionName=self.function_arn,
+                InvocationType='RequestResponse',  # Synchronous
+                Payload=json.dumps(payload)
+            )
+            
+            response_payload = json.loads(response['Payload'].read())
+            
+            if response_payload.get('statusCode') != 200:
+                error_msg = response_payload.get('body', 'Unknown error')
+                raise Exception(f"Lambda error: {error_msg}")
             
-            return (category, confidence)
+            body_data = json.loads(response_payload['body'])
+            
+            if not body_data.get('success'):
+                raise Exception(f"Batch classification failed: {body_data.get('error', 'Unknown error')}")
+            
+            decrypted_result = self.cipher.decrypt(body_data['encrypted_result'].encode())
+            result_data = json.loads(decrypted_result.decode())
+            
+            # Any email missing from the response keeps its deterministic fallback
+            results = list(fallback)
+            for item in result_data.get('results', []):
+                try:
+                    idx = int(item.get('id'))
+                except (TypeError, ValueError):
+                    continue
+                if 0 <= idx < len(results):
+                    label = str(item.get('label', '')).lower()
+                    results[idx] = (
+                        LABEL_TO_CATEGORY.get(label, 'GENERAL'),
+                        float(item.get('confidence', 0.75)),
+                        True
+                    )
+            
+            return results
             
         except Exception as e:
-            print(f"Error calling Lambda: {str(e)}")
+            print(f"Error calling Lambda for batch classification: {str(e)}")
             # Fallback to deterministic classification
-            return (deterministic_category, 0.5)
+            return fallback
     
     def generate_scheduled_email(
         self,
@@ -0,0 +1,66 @@
+"""
+Migration: Add the email listing and thread lookup indexes
+(email_classifications listing order, (user_id, thread_id) on email_classifications and deals)
+Run this before deploying, so run_lazy_migrations finds the indexes already built
+
+PostgreSQL builds them CONCURRENTLY, which does not block writes to the table.
+"""
+import argparse
+import os
+import sys
+from sqlalchemy import text
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import get_engine
+
+# index name -> (table, column list)
+LISTING_INDEXES = {
+    'idx_user_classified': ('email_classifications', 'user_id, classified_at DESC'),
+    'idx_user_category_classified': ('email_classifications', 'user_id, category, classified_at DESC'),
+    # Per-thread lookups (reclassify, generate-reply, deals); tables created before the
+    # models declared them may not have them
+    'idx_user_thread': ('email_classifications', 'user_id, thread_id'),
+    'idx_user_thread_deal': ('deals', 'user_id, thread_id'),
+}
+
+def plan_statements(conn):
+    """Build the CREATE INDEX statements for the listing and thread lookup indexes"""
+    # CONCURRENTLY is PostgreSQL-only
+    concurrently = 'CONCURRENTLY ' if conn.dialect.name == 'postgresql' else ''
+    return [
+        f"CREATE INDEX {concurrently}IF NOT EXISTS {name} ON {table} ({columns})"
+        for name, (table, columns) in LISTING_INDEXES.items()
+    ]
+
+def run_migration(dry_run=False):
+    """Add listing indexes to database"""
+    print("🔄 Starting listing index migration...")
+    engine = get_engine()
+    
+    if dry_run:
+        with engine.connect() as conn:
+            print("\n".join(plan_statements(conn)))
+        return
+    
+    try:
+        # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+        with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            for statement in plan_statements(conn):
+                print(f"  ➕ {statement}")
+                conn.execute(text(statement))
+        
+        print("✅ Migration completed successfully!")
+        
+    except Exception as e:
+        print(f"❌ Migration failed: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        raise
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--dry-run', action='store_true', help='Print the planned DDL without executing it')
+    args = parser.parse_args()
+    run_migration(dry_run=args.dry_run)
@@ -10,7 +10,7 @@ For Railway, run via Railway CLI or connect to database directly.
 """
 import os
 import sys
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, inspect, text
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -144,11 +144,7 @@ def add_encryption_columns_sqlite(database_url):
             
             # SQLite doesn't support IF NOT EXISTS in ALTER TABLE
             # Check if columns exist first
-            result = conn.execute(text("""
-                PRAGMA table_info(email_classifications);
-            """))
-            
-            existing_columns = [row[1] for row in result]
+            existing_columns = {col['name'] for col in inspect(conn).get_columns('email_classifications')}
             
             if 'subject_encrypted' not in existing_columns:
                 conn.execute(text("""
@@ -1,104 +1,83 @@
 """
 Migration: Add WhatsApp integration fields to User and Deal models
 Run this after deploying the updated models
+
+Uses a plain SQLAlchemy engine so the Flask app does not need to be imported.
 """
+import argparse
 import os
 import sys
-from sqlalchemy import text
+from sqlalchemy import inspect, text
 
 # Add parent directory to path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from app import app, db
+from db import get_engine
+
+# table -> [(column, type)]
+WHATSAPP_COLUMNS = {
+    'users': [
+        ('whatsapp_number', 'VARCHAR(20)'),
+        ('whatsapp_enabled', 'BOOLEAN DEFAULT FALSE'),
+    ],
+    'deals': [
+        ('whatsapp_alert_sent', 'BOOLEAN DEFAULT FALSE'),
+        ('whatsapp_alert_sent_at', 'TIMESTAMP'),
+        ('whatsapp_followup_count', 'INTEGER DEFAULT 0'),
+        ('whatsapp_last_followup_at', 'TIMESTAMP'),
+        ('whatsapp_stopped', 'BOOLEAN DEFAULT FALSE'),
+    ],
+}
 
-def run_migration():
+def plan_statements(conn):
+    """Build the ALTER statements needed to add any missing WhatsApp fields"""
+    statements = []
+    if conn.dialect.name == 'postgresql':
+        # PostgreSQL supports ADD COLUMN IF NOT EXISTS, so skip
+        # introspection and issue one ALTER per table
+        for table, columns in WHATSAPP_COLUMNS.items():
+            clauses = ", ".join(
+                f"ADD COLUMN IF NOT EXISTS {name} {col_type}" for name, col_type in columns
+            )
+            statements.append(f"ALTER TABLE {table} {clauses}")
+    else:
+        # SQLite has no IF NOT EXISTS on ADD COLUMN - check first
+        inspector = inspect(conn)
+        for table, columns in WHATSAPP_COLUMNS.items():
+            existing = {col['name'] for col in inspector.get_columns(table)}
+            for name, col_type in columns:
+                if name not in existing:
+                    statements.append(f"ALTER TABLE {table} ADD COLUMN {name} {col_type}")
+    return statements
+
+def run_migration(dry_run=False):
     """Add WhatsApp fields to database"""
-    with app.app_context():
-        try:
-            print("🔄 Starting WhatsApp fields migration...")
-            
-            # Check if columns already exist
-            with db.engine.connect() as conn:
-                # Check users table
-                result = conn.execute(text("""
-                    SELECT column_name 
-                    FROM information_schema.columns 
-                    WHERE table_name = 'users' 
-                    AND column_name IN ('whatsapp_number', 'whatsapp_enabled')
-                """))
-                existing_user_columns = [row[0] for row in result]
-                
-                # Check deals table
-                result = conn.execute(text("""
-                    SELECT column_name 
-                    FROM information_schema.columns 
-                    WHERE table_name = 'deals' 
-                    AND column_name IN ('whatsapp_alert_sent', 'whatsapp_alert_sent_at', 
-                                       'whatsapp_followup_count', 'whatsapp_last_followup_at', 'whatsapp_stopped')
-                """))
-                existing_deal_columns = [row[0] for row in result]
-            
-            # Add User fields
-            if 'whatsapp_number' not in existing_user_columns:
-                print("  ➕ Adding whatsapp_number to users table...")
-                db.session.execute(text("""
-                    ALTER TABLE users 
-                    ADD COLUMN whatsapp_number VARCHAR(20)
-                """))
-            
-            if 'whatsapp_enabled' not in existing_user_columns:
-                print("  ➕ Adding whatsapp_enabled to users table...")
-                db.session.execute(text("""
-                    ALTER TABLE users 
-                    ADD COLUMN whatsapp_enabled BOOLEAN DEFAULT FALSE
-                """))
-            
-            # Add Deal fields
-            if 'whatsapp_alert_sent' not in existing_deal_columns:
-                print("  ➕ Adding whatsapp_alert_sent to deals table...")
-                db.session.execute(text("""
-                    ALTER TABLE deals 
-                    ADD COLUMN whatsapp_alert_sent BOOLEAN DEFAULT FALSE
-                """))
-            
-            if 'whatsapp_alert_sent_at' not in existing_deal_columns:
-                print("  ➕ Adding whatsapp_alert_sent_at to deals table...")
-                db.session.execute(text("""
-                    ALTER TABLE deals 
-                    ADD COLUMN whatsapp_alert_sent_at TIMESTAMP
-                """))
-            
-            if 'whatsapp_followup_count' not in existing_deal_columns:
-                print("  ➕ Adding whatsapp_followup_count to deals table...")
-                db.session.execute(text("""
-                    ALTER TABLE deals 
-                    ADD COLUMN whatsapp_followup_count INTEGER DEFAULT 0
-                """))
-            
-            if 'whatsapp_last_followup_at' not in existing_deal_columns:
-                print("  ➕ Adding whatsapp_last_followup_at to deals table...")
-                db.session.execute(text("""
-                    ALTER TABLE deals 
-                    ADD COLUMN whatsapp_last_followup_at TIMESTAMP
-                """))
-            
-            if 'whatsapp_stopped' not in existing_deal_columns:
-                print("  ➕ Adding whatsapp_stopped to deals table...")
-                db.session.execute(text("""
-                    ALTER TABLE deals 
-                    ADD COLUMN whatsapp_stopped BOOLEAN DEFAULT FALSE
-                """))
-            
-            db.session.commit()
-            print("✅ Migration completed successfully!")
-            
-        except Exception as e:
-            db.session.rollback()
-            print(f"❌ Migration failed: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            raise
+    print("🔄 Starting WhatsApp fields migration...")
+    engine = get_engine()
+    
+    if dry_run:
+        # Planning only reads metadata, so no ALTER lock is taken
+        with engine.connect() as conn:
+            print("\n".join(plan_statements(conn)))
+        return
+    
+    try:
+        # begin() commits once on success and rolls back automatically on error
+        with engine.begin() as conn:
+            for statement in plan_statements(conn):
+                print(f"  ➕ {statement}")
+                conn.execute(text(statement))
+        
+        print("✅ Migration completed successfully!")
+        
+    except Exception as e:
+        print(f"❌ Migration failed: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        raise
 
 if __name__ == '__main__':
-    run_migration()
-
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--dry-run', action='store_true', help='Print the planned DDL without executing it')
+    args = parser.parse_args()
+    run_migration(dry_run=args.dry_run)
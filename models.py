@@ -3,6 +3,7 @@ Database models for multi-user system
 """
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
+from sqlalchemy.dialects import postgresql
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
 
@@ -73,6 +74,7 @@ class GmailToken(db.Model):
     encrypted_token = db.Column(db.Text, nullable=False)  # Encrypted JSON token
     selected_signature_email = db.Column(db.String(255))  # Email address of selected send-as alias for signature
     history_id = db.Column(db.String(255))  # Gmail history ID for incremental sync
+    email_address = db.Column(db.String(255))  # Connected Gmail address (cached from the profile)
     # Pub/Sub fields for push notifications (test environment)
     pubsub_topic = db.Column(db.String(255))  # Pub/Sub topic name (e.g., projects/PROJECT_ID/topics/gmail-notifications)
     pubsub_subscription = db.Column(db.String(255))  # Pub/Sub subscription name
@@ -105,7 +107,8 @@ class EmailClassification(db.Model):
     email_date = db.Column(db.BigInteger)  # Gmail internalDate timestamp
     
     category = db.Column(db.String(20), nullable=False)  # DEAL_FLOW, NETWORKING, HIRING, SPAM, GENERAL
-    tags = db.Column(db.String(255))  # Comma-separated tags: DF/Deal, DF/AskMore, NW/Networking, HR/Hiring, SPAM/Skip
+    # Tag list: DF/Deal, DF/AskMore, NW/Networking, HR/Hiring, SPAM/Skip (text[] on PostgreSQL, JSON elsewhere)
+    tags = db.Column(db.JSON().with_variant(postgresql.ARRAY(db.String(64)), 'postgresql'))
     reply_type = db.Column(db.String(50))  # ack, ask-more, none
     reply_sent = db.Column(db.Boolean, default=False)
     confidence = db.Column(db.Float)  # Classification confidence score
@@ -115,11 +118,13 @@ class EmailClassification(db.Model):
     # Deal Flow specific
     deal_state = db.Column(db.String(50))  # New, Ask-More, Routed (for Deal Flow only)
     deck_link = db.Column(db.Text)  # Detected deck/dataroom link
-    extracted_links = db.Column(db.Text)  # JSON array of all links
+    extracted_links = db.Column(db.JSON().with_variant(postgresql.JSONB(), 'postgresql'))  # List of all links (jsonb on PostgreSQL)
     
     # Index for quick lookups and unique constraint to prevent duplicates
     __table_args__ = (
         db.Index('idx_user_thread', 'user_id', 'thread_id'),
+        db.Index('idx_user_classified', 'user_id', classified_at.desc()),  # Listing with spam shown
+        db.Index('idx_user_category_classified', 'user_id', 'category', classified_at.desc()),  # Dashboard listing
         db.UniqueConstraint('user_id', 'message_id', name='uq_user_message'),  # Prevent duplicate emails per user
     )
     
@@ -171,6 +176,20 @@ class EmailClassification(db.Model):
         return f'<EmailClassification {self.category} for thread {self.thread_id}>'
 
 
+class ClassificationCache(db.Model):
+    """Classification results keyed by a hash of the email content (shared across users)"""
+    __tablename__ = 'classification_cache'
+    
+    content_hash = db.Column(db.String(64), primary_key=True)  # SHA-256 hex of subject/sender/body
+    category = db.Column(db.String(20), nullable=False)
+    tags = db.Column(db.JSON().with_variant(postgresql.ARRAY(db.String(64)), 'postgresql'))  # List of tags (same type as EmailClassification.tags)
+    confidence = db.Column(db.Float)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<ClassificationCache {self.category} {self.content_hash[:12]}>'
+
+
 class Deal(db.Model):
     """Deal Flow tracking - founders and deals"""
     __tablename__ = 'deals'
@@ -207,10 +226,10 @@ class Deal(db.Model):
     # Portfolio matching and scoring
     founder_linkedin = db.Column(db.Text)  # LinkedIn URL
     founder_school = db.Column(db.String(255))  # Extracted from LinkedIn/email
-    founder_previous_companies = db.Column(db.Text)  # JSON array
+    founder_previous_companies = db.Column(db.JSON().with_variant(postgresql.JSONB(), 'postgresql'))  # List of companies
     
     # Portfolio overlaps
-    portfolio_overlaps = db.Column(db.Text)  # JSON: overlaps with portfolio
+    portfolio_overlaps = db.Column(db.JSON().with_variant(postgresql.JSONB(), 'postgresql'), default=dict)  # Overlaps with portfolio
     
     # Scores (0-100) - Old system (kept for backward compatibility)
     risk_score = db.Column(db.Float)
@@ -224,7 +243,7 @@ class Deal(db.Model):
     overall_score = db.Column(db.Float)  # Weighted average: 60% team + 40% white space
     
     # White space analysis details (JSON)
-    white_space_analysis = db.Column(db.Text)  # JSON with subsector, competition, market size, etc.
+    white_space_analysis = db.Column(db.JSON().with_variant(postgresql.JSONB(), 'postgresql'))  # Subsector, competition, market size, etc.
     
     # Relationship
     classification = db.relationship('EmailClassification', backref='deal')
@@ -2,7 +2,18 @@
 OpenAI Client for generating email replies (supports OpenAI and Moonshot)
 """
 import os
-from openai import OpenAI
+import httpx
+from openai import OpenAI, DEFAULT_TIMEOUT
+
+# One pooled HTTP client shared by every OpenAIClient so keep-alive connections
+# (and their TLS sessions) survive across requests, tasks and threads.
+# Timeout, pool size and redirects match the client the SDK builds itself: the SDK
+# takes the timeout from a passed-in client, and thinking-model replies run long.
+_HTTP_CLIENT = httpx.Client(
+    limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+    timeout=DEFAULT_TIMEOUT,
+    follow_redirects=True
+)
 
 
 class OpenAIClient:
@@ -17,7 +28,8 @@ class OpenAIClient:
                 raise ValueError("Moonshot API key not found. Please set MOONSHOT_API_KEY or OPENAI_API_KEY environment variable.")
             self.client = OpenAI(
                 base_url="https://api.moonshot.ai/v1",
-                api_key=self.api_key
+                api_key=self.api_key,
+                http_client=_HTTP_CLIENT
             )
             self.model = "kimi-k2-thinking"
             print("✓ Moonshot (Kimi) client initialized")
@@ -26,7 +38,7 @@ class OpenAIClient:
             self.api_key = api_key or os.getenv('OPENAI_API_KEY')
             if not self.api_key:
                 raise ValueError("OpenAI API key not found. Please set OPENAI_API_KEY environment variable.")
-            self.client = OpenAI(api_key=self.api_key)
+            self.client = OpenAI(api_key=self.api_key, http_client=_HTTP_CLIENT)
             self.model = "gpt-4o-mini"
             print("✓ OpenAI client initialized")
     
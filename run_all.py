@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Run the standalone column migrations concurrently
+Each migration touches a different table, so they can share the pooled
+engine from db.py without contending for the same table lock.
+Run this on Railway: railway run python run_all.py
+"""
+import argparse
+import logging
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import add_google_user_columns
+import add_processed_column
+
+log = logging.getLogger('migrate')
+
+MIGRATIONS = {
+    'add_google_user_columns': add_google_user_columns.run_migration,
+    'add_processed_column': add_processed_column.run_migration,
+}
+
+
+def main(dry_run=False):
+    failed = []
+    with ThreadPoolExecutor(max_workers=len(MIGRATIONS)) as executor:
+        futures = {executor.submit(fn, dry_run=dry_run): name for name, fn in MIGRATIONS.items()}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                future.result()
+                log.info(f"✅ {name} finished")
+            except Exception as e:
+                log.error(f"❌ {name} failed: {e}")
+                failed.append(name)
+    
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--dry-run', action='store_true', help='Print the planned DDL without executing it')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    main(dry_run=args.dry_run)
@@ -8,6 +8,8 @@ import sys
 from dotenv import load_dotenv
 from sqlalchemy import create_engine, text
 
+from schema_cache import get_columns, invalidate
+
 load_dotenv()
 
 def main():
@@ -32,13 +34,7 @@ def main():
         
         try:
             # Check if columns exist
-            result = conn.execute(text("""
-                SELECT column_name 
-                FROM information_schema.columns 
-                WHERE table_name = 'email_classifications' 
-                AND column_name IN ('subject_encrypted', 'snippet_encrypted')
-            """))
-            existing = [row[0] for row in result]
+            existing = get_columns(conn, 'email_classifications')
             
             if 'subject_encrypted' in existing and 'snippet_encrypted' in existing:
                 print("✅ Columns already exist - nothing to do!")
@@ -60,6 +56,8 @@ def main():
                 """))
                 print("   ✅ Added snippet_encrypted")
             
+            invalidate('email_classifications')
+            
             # Migrate data
             conn.execute(text("""
                 UPDATE email_classifications 
@@ -0,0 +1,21 @@
+"""
+Process-wide cache of column metadata for migration scripts
+"""
+from sqlalchemy import inspect
+
+# table name -> {column_name: Inspector column dict ('name', 'type', 'nullable', 'default', ...)}
+_column_cache = {}
+
+
+def get_columns(conn, table):
+    """Return column metadata for a table, introspecting the database only on a cache miss"""
+    if table not in _column_cache:
+        # Inspector dispatches to the dialect's own lookup (information_schema
+        # on PostgreSQL, PRAGMA on SQLite)
+        _column_cache[table] = {col['name']: col for col in inspect(conn).get_columns(table)}
+    return _column_cache[table]
+
+
+def invalidate(table):
+    """Drop cached metadata for a table after an ALTER changes it"""
+    _column_cache.pop(table, None)
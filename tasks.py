@@ -3,8 +3,8 @@ Background tasks for email processing
 """
 import os
 import sys
-import json
 from datetime import datetime, timedelta
+from email.utils import parseaddr
 from celery import current_task
 from celery_config import celery
 
@@ -50,7 +50,7 @@ def sync_user_emails(self, user_id, max_emails=50, force_full_sync=False, new_hi
     
     from models import User, GmailToken, EmailClassification, Deal
     from gmail_client import GmailClient
-    from email_classifier import EmailClassifier, CATEGORY_DEAL_FLOW
+    from email_classifier import EmailClassifier, CATEGORY_DEAL_FLOW, DECK_LINK_RE
     from openai_client import OpenAIClient
     from lambda_client import LambdaClient
     from auth import decrypt_token
@@ -380,10 +380,10 @@ def sync_user_emails(self, user_id, max_emails=50, force_full_sync=False, new_hi
                             sender=email.get('from', 'Unknown'),
                             email_date=email.get('date'),
                             category='GENERAL',  # Temporary category, will be updated by bidirectional workers
-                            tags='',
+                            tags=[],
                             confidence=0.0,
                             processed=False,  # Not processed yet - bidirectional workers will handle it
-                            extracted_links=json.dumps([])
+                            extracted_links=[]
                         )
                         # Use encrypted field setters
                         new_classification.set_subject_encrypted(email.get('subject', 'No Subject'))
@@ -452,9 +452,9 @@ def sync_user_emails(self, user_id, max_emails=50, force_full_sync=False, new_hi
                         sender=email.get('from', 'Unknown'),
                         email_date=email.get('date'),
                         category=classification_result['category'],
-                        tags=','.join(classification_result.get('tags', [])),
+                        tags=list(classification_result.get('tags', [])),
                         confidence=classification_result.get('confidence', 0.0),
-                        extracted_links=json.dumps(classification_result.get('links', []))
+                        extracted_links=list(classification_result.get('links', []))
                     )
                     # Use encrypted field setters
                     new_classification.set_subject_encrypted(email.get('subject', 'No Subject'))
@@ -557,9 +557,7 @@ def sync_user_emails(self, user_id, max_emails=50, force_full_sync=False, new_hi
                     # Deal Flow specific processing
                     deal_created = False
                     if classification_result['category'] == CATEGORY_DEAL_FLOW:
-                        deck_links = [l for l in classification_result.get('links', []) if any(
-                            ind in l.lower() for ind in ['docsend', 'dataroom', 'deck', 'drive.google.com', 'dropbox.com', 'notion.so']
-                        )]
+                        deck_links = [l for l in classification_result.get('links', []) if DECK_LINK_RE.search(l)]
                         
                         if pdf_attachments:
                             pdf_filename = pdf_attachments[0].get('filename', 'deck.pdf')
@@ -578,8 +576,9 @@ def sync_user_emails(self, user_id, max_emails=50, force_full_sync=False, new_hi
                         )
                         
                         # Extract founder info
-                        founder_email = email.get('from', '').split('<')[1].split('>')[0] if '<' in email.get('from', '') else email.get('from', '')
-                        founder_name = email.get('from', '').split('<')[0].strip() if '<' in email.get('from', '') else ''
+                        raw_from = email.get('from', '') or ''
+                        founder_name, founder_email = parseaddr(raw_from)
+                        founder_email = founder_email or raw_from
                         
                         # Create Deal record
                         deal = Deal(
@@ -682,9 +681,8 @@ def sync_user_emails(self, user_id, max_emails=50, force_full_sync=False, new_hi
                                             # Schedule auto-reply to send after 10 minutes instead of immediately
                                             try:
                                                 # Extract sender email
-                                                sender_email = email.get('from', '')
-                                                if '<' in sender_email and '>' in sender_email:
-                                                    sender_email = sender_email.split('<')[1].split('>')[0]
+                                                sender_email = email.get('from', '') or ''
+                                                sender_email = parseaddr(sender_email)[1] or sender_email
                                                 
                                                 # Generate nice "we'll reply soon" message
                                                 reply_subject = email.get('subject', 'No Subject')
@@ -1100,9 +1098,9 @@ def fetch_older_emails(self, user_id, max_emails=200):
                         sender=email.get('from', 'Unknown'),
                         email_date=email.get('date'),
                         category=classification_result['category'],
-                        tags=','.join(classification_result.get('tags', [])),
+                        tags=list(classification_result.get('tags', [])),
                         confidence=classification_result.get('confidence', 0.0),
-                        extracted_links=json.dumps(classification_result.get('links', []))
+                        extracted_links=list(classification_result.get('links', []))
                     )
                     new_classification.set_subject_encrypted(email.get('subject', 'No Subject'))
                     new_classification.set_snippet_encrypted(email.get('snippet', ''))
@@ -1976,7 +1974,7 @@ def classify_bidirectional(self, user_id, batch_size=50, direction='forward'):
                             tags = classification_result.get('tags', [])
                             
                             email_locked.category = category
-                            email_locked.tags = ','.join(tags) if isinstance(tags, list) else tags
+                            email_locked.tags = list(tags) if isinstance(tags, (list, tuple)) else [tag for tag in (tags or '').split(',') if tag]
                             email_locked.confidence = confidence
                             email_locked.processed = True
                             
@@ -1996,8 +1994,10 @@ def classify_bidirectional(self, user_id, batch_size=50, direction='forward'):
                                 
                                 if not existing_deal:
                                     # Create Deal record
-                                    founder_name = email_locked.sender.split('<')[0].strip() if email_locked.sender else 'Unknown'
-                                    founder_email = email_locked.sender if email_locked.sender else ''
+                                    raw_from = email_locked.sender or ''
+                                    founder_name, founder_email = parseaddr(raw_from)
+                                    founder_name = founder_name or raw_from or 'Unknown'
+                                    founder_email = founder_email or raw_from
                                     
                                     deal = Deal(
                                         user_id=user_id,